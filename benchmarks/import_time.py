@@ -0,0 +1,77 @@
+"""
+Import-time regression benchmark for the CLI subcommands.
+
+Each subcommand's modules are imported in a fresh interpreter and the best of
+several runs is reported. Exits with status 1 if a command listed in BUDGETS
+takes longer than its budget, e.g. because a module started importing pandas
+or matplotlib at the top level again.
+
+    python benchmarks/import_time.py [--repeat 5]
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# modules imported by `pka-calculator <command>`
+COMMAND_MODULES = {
+    'monitor': ['monitor'],
+    'calculate': ['calculator'],
+    'orchestrate': ['orchestrator'],
+    'deprotonate': ['deprotonator'],
+    'equilibrate': ['equilibrator'],
+    'process': ['processor'],
+    'analyze': ['analyzer'],
+    'minpka': ['min_pka'],
+    'visualize': ['visualizer'],
+    'interactive': ['interactive'],
+    'pipeline': ['pipeline'],
+}
+
+# seconds; commands run in loops on login nodes must start fast
+BUDGETS = {
+    'monitor': 0.3,
+    'calculate': 0.5,
+}
+
+TIMER = (
+    "import time; start = time.perf_counter(); "
+    "import pka_calculator.cli; {imports}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_time(modules):
+    imports = "; ".join(f"import pka_calculator.{m}" for m in modules)
+    result = subprocess.run([sys.executable, "-c", TIMER.format(imports=imports)],
+                            cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    return float(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs per command, the fastest is reported')
+    args = parser.parse_args()
+
+    failed = []
+    print(f"{'Command':<14}{'Import (s)':>12}{'Budget (s)':>12}")
+    for command, modules in COMMAND_MODULES.items():
+        best = min(import_time(modules) for _ in range(args.repeat))
+        budget = BUDGETS.get(command)
+        mark = ''
+        if budget is not None and best > budget:
+            failed.append(command)
+            mark = '  SLOW'
+        budget_text = f"{budget:.2f}" if budget is not None else '-'
+        print(f"{command:<14}{best:>12.3f}{budget_text:>12}{mark}")
+
+    if failed:
+        print(f"\nOver budget: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
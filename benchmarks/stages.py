@@ -0,0 +1,122 @@
+"""
+Throughput benchmark of the processing stages on a synthetic calculation tree.
+
+Times parse_output_file, collect_results (without and with the parse cache),
+analyze_results and extract_min_pka and reports files/s or rows/s and the peak
+Python memory (tracemalloc) of each stage. Runs offline: the tree is made by
+synthetic_tree.py, no ORCA or Slurm is needed.
+
+    python benchmarks/stages.py -n 200 -m 3 --repeat 3
+    python benchmarks/stages.py --tree synthetic/     # reuse a generated tree
+"""
+import argparse
+import contextlib
+import gc
+import io
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from synthetic_tree import EXPERIMENTAL_FILE, add_tree_arguments, generate_tree, tree_options  # noqa: E402
+from pka_calculator import manifest  # noqa: E402
+from pka_calculator.processor import collect_results, find_output_files, parse_output_file, results_dataframe  # noqa: E402
+from pka_calculator.analyzer import analyze_results  # noqa: E402
+from pka_calculator.min_pka import extract_min_pka  # noqa: E402
+
+
+def measure(func, repeat):
+    """Best wall time of repeat runs of func, peak traced memory of one more run, last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        # stages report progress with print; keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run_benchmarks(calc_dir, output_dir, repeat=3, workers=1):
+    calc_dir = Path(calc_dir)
+    experimental_file = calc_dir / EXPERIMENTAL_FILE
+    manifest.load_manifest(calc_dir, rescan=True)
+    files = [output_file for _, output_file in find_output_files(calc_dir)]
+    megabytes = sum(Path(f).stat().st_size for f in files) / 1e6
+    print(f"Tree: {calc_dir} ({len(files)} outputs, {megabytes:.1f} MB)\n")
+
+    def uncached():
+        return collect_results(calc_dir, workers=workers, use_cache=False)
+
+    def cached():
+        return collect_results(calc_dir, workers=workers, use_cache=True)
+
+    rows = []
+    seconds, peak, _ = measure(lambda: [parse_output_file(f) for f in files], repeat)
+    rows.append(("parse_output_file", len(files), "files", seconds, peak))
+
+    seconds, peak, results = measure(uncached, repeat)
+    rows.append(("collect_results", len(files), "files", seconds, peak))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        collect_results(calc_dir, workers=workers, use_cache=True, rebuild_cache=True)  # warm cache
+    seconds, peak, _ = measure(cached, repeat)
+    rows.append(("collect_results (cache)", len(files), "files", seconds, peak))
+
+    results_df = results_dataframe(results)
+    seconds, peak, (_, _, pka_df) = measure(
+        lambda: analyze_results(output_dir, experimental_file, output_dir, "bench",
+                                results_df=results_df, save=False), repeat)
+    rows.append(("analyze_results", len(results_df), "rows", seconds, peak))
+
+    seconds, peak, _ = measure(
+        lambda: extract_min_pka(output_dir, output_dir, "bench", pka_df=pka_df, save=False), repeat)
+    rows.append(("extract_min_pka", len(pka_df), "rows", seconds, peak))
+
+    print(f"{'Stage':<26}{'Items':>9}{'Time (s)':>11}{'Items/s':>13}{'Peak MB':>10}")
+    for stage, items, unit, seconds, peak in rows:
+        print(f"{stage:<26}{items:>9}{seconds:>11.3f}{items / seconds:>9.0f} {unit:<5}{peak / 1e6:>8.1f}")
+    print(f"\nparse_output_file: {megabytes / rows[0][3]:.0f} MB/s")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tree', default=None,
+                        help='Existing synthetic tree to use instead of generating one')
+    parser.add_argument('--keep', default=None,
+                        help='Generate the tree into this directory and keep it')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest is reported')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Workers of collect_results')
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="pka_bench_"))
+    try:
+        if args.tree:
+            calc_dir = Path(args.tree)
+        else:
+            calc_dir = Path(args.keep) if args.keep else work_dir / "calc"
+            start = time.perf_counter()
+            files = generate_tree(calc_dir, **tree_options(args))
+            print(f"Generated {files} calculations in {time.perf_counter() - start:.1f} s")
+        run_benchmarks(calc_dir, work_dir, args.repeat, args.workers)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Synthetic calculation tree for the benchmarks.
+
+Builds calc_dir/basis/molecule/form/method with an ORCA-like output.out and an
+input_trj.xyz per calculation, plus an experimental pKa file, without ORCA or
+Slurm. Every output has the optimization cycles, SCF and Mulliken sections of
+a real one, padded to about --output-kb, and ends with the Gibbs energy,
+termination banner and run time that processor.parse_output looks for.
+Energies are chosen so that analyze gives pKa values close to the experimental ones.
+
+    python benchmarks/synthetic_tree.py synthetic/ -n 100 -m 3 -d 2 -p 1
+"""
+import argparse
+import math
+import random
+from pathlib import Path
+
+BASIS = "def2-SVP"
+METHODS = ["B3LYP", "PBE0", "M062X", "wB97XD", "TPSSh", "HF", "BP86", "CAM-B3LYP"]
+ELEMENTS = ["C", "C", "C", "H", "H", "H", "H", "O", "N"]
+EXPERIMENTAL_FILE = "experimental_pka.csv"
+
+HARTREE_TO_KJ = 2625.5
+RT_LN10 = 8.314462618 * 298.15 * math.log(10) / 1000  # kJ/mol
+G_PROTON = -1105.0  # kJ/mol, G(H+) the generated energies are consistent with
+
+HEADER = """                                 *****************
+                                 * O   R   C   A *
+                                 *****************
+
+                         Program Version 5.0.4 -  RELEASE  -
+
+ Synthetic output written by benchmarks/synthetic_tree.py
+
+"""
+
+
+def random_geometry(rng, n_atoms):
+    elements = ["O", "H"] + [rng.choice(ELEMENTS) for _ in range(n_atoms - 2)]
+    coords = [[rng.uniform(-3, 3) for _ in range(3)] for _ in range(n_atoms)]
+    return elements, coords
+
+
+def xyz_frame(elements, coords, energy):
+    lines = [str(len(elements)), f"Coordinates from ORCA-job input E {energy:.12f}"]
+    lines += [f"  {e:<2} {x:12.6f} {y:12.6f} {z:12.6f}" for e, (x, y, z) in zip(elements, coords)]
+    return "\n".join(lines) + "\n"
+
+
+def cycle_block(rng, cycle, elements, energy, charge, padding):
+    """One geometry optimization cycle: SCF iterations, energy and Mulliken charges"""
+    lines = [
+        "",
+        "         *************************************************************",
+        f"         *                GEOMETRY OPTIMIZATION CYCLE {cycle:3d}            *",
+        "         *************************************************************",
+        "",
+        "--------------",
+        "SCF ITERATIONS",
+        "--------------",
+        "ITER       Energy         Delta-E        Max-DP      RMS-DP      [F,P]     Damp",
+    ]
+    iterations = rng.randint(6, 14)
+    for i in range(iterations):
+        delta = 10.0 ** -(i + 1)
+        lines.append(f"  {i:2d}  {energy + delta:16.9f}  {-delta:12.9f}  "
+                     f"{rng.random() * delta:10.8f}  {rng.random() * delta:10.8f}  "
+                     f"{rng.random() * delta:10.8f}  0.7000")
+    lines += [
+        "",
+        f"               *           SCF CONVERGED AFTER {iterations:3d} CYCLES          *",
+        "",
+        "-------------------------   --------------------",
+        f"FINAL SINGLE POINT ENERGY      {energy:.12f}",
+        "-------------------------   --------------------",
+        "",
+        "                    ********************************",
+        "                    * MULLIKEN POPULATION ANALYSIS *",
+        "                    ********************************",
+        "",
+        "-----------------------",
+        "MULLIKEN ATOMIC CHARGES",
+        "-----------------------",
+    ]
+    charges = [rng.uniform(-0.8, 0.5) for _ in elements]
+    shift = (charge - sum(charges)) / len(charges)
+    lines += [f"{i:4d} {e:<2}:  {q + shift:10.6f}" for i, (e, q) in enumerate(zip(elements, charges))]
+    lines += [
+        f"Sum of atomic charges:  {charge:10.7f}",
+        "",
+        "--------------------------------",
+        "MULLIKEN REDUCED ORBITAL CHARGES",
+        "--------------------------------",
+    ]
+    block = "\n".join(lines) + "\n"
+
+    # orbital charges fill the cycle up to the requested size
+    rows = []
+    size = len(block)
+    atom = 0
+    while size < padding:
+        row = (f"  {atom % len(elements):3d} {elements[atom % len(elements)]:<2}s       :"
+               f"  {rng.uniform(0, 2):10.6f}  s :  {rng.uniform(0, 2):10.6f}\n")
+        rows.append(row)
+        size += len(row)
+        atom += 1
+    return block + "".join(rows)
+
+
+def output_text(rng, elements, gibbs, charge, cycles, output_bytes, terminated=True):
+    """Text of an ORCA-like output.out of about output_bytes"""
+    padding = max(0, output_bytes - len(HEADER) - 1500) // cycles
+    electronic = gibbs - rng.uniform(0.005, 0.05)
+    parts = [HEADER]
+    for cycle in range(1, cycles + 1):
+        energy = electronic + 0.05 * math.exp(-cycle / 3)
+        parts.append(cycle_block(rng, cycle, elements, energy, charge, padding))
+    if not terminated:
+        return "".join(parts)
+
+    enthalpy = gibbs + rng.uniform(0.02, 0.04)
+    hours, minutes = divmod(rng.randint(1, 600), 60)
+    parts.append(f"""
+                  ***********************HURRAY********************
+                  ***        THE OPTIMIZATION HAS CONVERGED     ***
+                  *************************************************
+
+-------------------
+GIBBS FREE ENERGY
+-------------------
+
+The Gibbs free energy is G = H - T*S
+
+Total enthalpy                    ...   {enthalpy:.8f} Eh
+Total entropy correction          ...     {gibbs - enthalpy:.8f} Eh
+-----------------------------------------------------------------------
+Final Gibbs free energy         ...   {gibbs:.8f} Eh
+
+For completeness - the Gibbs free energy minus the electronic energy
+G-E(el)                           ...     {gibbs - electronic:.8f} Eh
+
+
+Timings for individual modules:
+
+Sum of individual times         ...     {hours * 3600 + minutes * 60:.3f} sec
+                             ****ORCA TERMINATED NORMALLY****
+TOTAL RUN TIME: 0 days {hours} hours {minutes} minutes {rng.randint(0, 59)} seconds {rng.randint(0, 999)} msec
+""")
+    return "".join(parts)
+
+
+def write_calculation(path, rng, elements, coords, gibbs, charge, cycles, output_bytes, terminated):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "output.out").write_text(
+        output_text(rng, elements, gibbs, charge, cycles, output_bytes, terminated))
+    frames = []
+    for cycle in range(cycles):
+        moved = [[c + rng.gauss(0, 0.02) for c in xyz] for xyz in coords]
+        frames.append(xyz_frame(elements, moved, gibbs - 0.01 * math.exp(-cycle)))
+    (path / "input_trj.xyz").write_text("".join(frames))
+
+
+def generate_tree(calc_dir, molecules=50, methods=2, deprotonated=2, protonated=0, atoms=12,
+                  cycles=20, output_kb=256, incomplete=0.0, seed=0):
+    """
+    Write a synthetic tree to calc_dir and return the number of output.out files.
+
+    Every molecule has a neutral form, `deprotonated` H<i>_deprotonated forms and
+    `protonated` H<i>_protonated forms, each calculated with `methods` methods.
+    A fraction `incomplete` of the outputs stop before the termination banner.
+    """
+    rng = random.Random(seed)
+    calc_dir = Path(calc_dir)
+    calc_dir.mkdir(parents=True, exist_ok=True)
+    method_names = [METHODS[i % len(METHODS)] + (f"-{i // len(METHODS)}" if i >= len(METHODS) else "")
+                    for i in range(methods)]
+    output_bytes = output_kb * 1024
+
+    experimental = []
+    files = 0
+    for m in range(molecules):
+        molecule = f"mol{m:05d}"
+        pka = rng.uniform(0, 14)
+        experimental.append((molecule, pka))
+        elements, coords = random_geometry(rng, atoms)
+        g_neutral = -40.0 * atoms - rng.uniform(0, 10)
+
+        forms = [("neutral", 0, elements, coords, g_neutral)]
+        for i in range(deprotonated):
+            # G_D from pKa = (G_D + G(H+) - G_N) / RT ln10, lowest for the first site
+            g = g_neutral + (pka * RT_LN10 - G_PROTON + 5 * i + rng.gauss(0, 3)) / HARTREE_TO_KJ
+            forms.append((f"H{i + 1}_deprotonated", -1, elements[1:], coords[1:], g))
+        for i in range(protonated):
+            # G_P from pKa = (G_N + G(H+) - G_P) / RT ln10
+            g = g_neutral + (G_PROTON - pka * RT_LN10 - 5 * i + rng.gauss(0, 3)) / HARTREE_TO_KJ
+            forms.append((f"H{i + 1}_protonated", 1, elements + ["H"], coords + [[0.0, 0.0, 1.0]], g))
+
+        for form, charge, form_elements, form_coords, gibbs in forms:
+            for method in method_names:
+                path = calc_dir / BASIS / molecule / form / method
+                terminated = rng.random() >= incomplete
+                write_calculation(path, rng, form_elements, form_coords, gibbs + rng.gauss(0, 1e-3),
+                                  charge, cycles, output_bytes, terminated)
+                files += 1
+
+    with open(calc_dir / EXPERIMENTAL_FILE, "w") as f:
+        f.write("Molecule;pKa (exp)\n")
+        f.writelines(f"{molecule};{pka:.2f}\n" for molecule, pka in experimental)
+    return files
+
+
+def add_tree_arguments(parser):
+    parser.add_argument('-n', '--molecules', type=int, default=50, help='Number of molecules')
+    parser.add_argument('-m', '--methods', type=int, default=2, help='Methods per form')
+    parser.add_argument('-d', '--deprotonated', type=int, default=2, help='Deprotonated forms per molecule')
+    parser.add_argument('-p', '--protonated', type=int, default=0, help='Protonated forms per molecule')
+    parser.add_argument('--atoms', type=int, default=12, help='Atoms per neutral molecule')
+    parser.add_argument('--cycles', type=int, default=20,
+                        help='Optimization cycles per output (= frames of input_trj.xyz)')
+    parser.add_argument('--output-kb', type=int, default=256, help='Approximate size of each output.out')
+    parser.add_argument('--incomplete', type=float, default=0.0,
+                        help='Fraction of outputs without normal termination')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+
+def tree_options(args):
+    return dict(molecules=args.molecules, methods=args.methods, deprotonated=args.deprotonated,
+                protonated=args.protonated, atoms=args.atoms, cycles=args.cycles,
+                output_kb=args.output_kb, incomplete=args.incomplete, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('calc_dir', help='Directory to create the tree in')
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+
+    files = generate_tree(args.calc_dir, **tree_options(args))
+    print(f"Wrote {files} calculations to {args.calc_dir} "
+          f"(experimental pKa in {Path(args.calc_dir) / EXPERIMENTAL_FILE})")
+
+
+if __name__ == '__main__':
+    main()
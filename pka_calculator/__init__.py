@@ -1,10 +1,32 @@
-from .calculator import calculate_pka
-from .processor import process_results
-from .analyzer import analyze_results
-from .visualizer import visualize_results
-from .monitor import monitor_jobs
-from .deprotonator import process_deprotonation
-
-__all__ = ['calculate_pka', 'process_results', 'analyze_results', 
-           'visualize_results', 'monitor_jobs', 'process_deprotonation', 
-           'process_equilibrated', 'extract_min_pka', 'make_interactive_html']
\ No newline at end of file
+import importlib
+
+# Public functions and the modules defining them. They are imported on first
+# access, so the CLI and light modules (monitor, calculator) do not pull in
+# pandas, matplotlib, scipy or plotly.
+_EXPORTS = {
+    'calculate_pka': 'calculator',
+    'process_results': 'processor',
+    'analyze_results': 'analyzer',
+    'visualize_results': 'visualizer',
+    'monitor_jobs': 'monitor',
+    'process_deprotonation': 'deprotonator',
+    'process_equilibrated': 'equilibrator',
+    'extract_min_pka': 'min_pka',
+    'make_interactive_html': 'interactive',
+    'run_pipeline': 'pipeline',
+    'orchestrate': 'orchestrator',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from .storage import read_table, write_table
 
 # Constants
 R = 8.314462618  # J/(mol·K)
@@ -8,27 +9,53 @@ T = 298.15  # K
 RT_in10 = R * T * np.log(10) / 1000  # kJ/mol
 HARTREE_TO_KJ = 2625.5
 
-def calculate_gh_for_molecule_deprotonated(molecule_data):
-    """Calculate G(H+) for a molecule using only the form with minimal g_a - g_ha"""
-    molecule_data['delta_g'] = molecule_data['G_D'] - molecule_data['G_N']
-    min_idx = molecule_data['delta_g'].idxmin()
-    row = molecule_data.loc[min_idx]
-    g_ha = row['G_N'] * HARTREE_TO_KJ
-    g_a = row['G_D'] * HARTREE_TO_KJ
-    pka = row['pKa (exp)']
-    g_h = pka * RT_in10 + g_ha - g_a
-    return g_h, min_idx, row['Molecule']
-
-def calculate_gh_for_molecule_protonated(molecule_data):
-    """Calculate G(H+) for a molecule using protonated form with minimal g_ha - g_h2a"""
-    molecule_data['delta_g'] = molecule_data['G_N'] - molecule_data['G_P']
-    min_idx = molecule_data['delta_g'].idxmin()
-    row = molecule_data.loc[min_idx]
-    g_ha = row['G_N'] * HARTREE_TO_KJ
-    g_h2a = row['G_P'] * HARTREE_TO_KJ
-    pka = row['pKa (exp)']
-    g_h = pka * RT_in10 + g_h2a - g_ha
-    return g_h, min_idx, row['Molecule']
+def extract_gh_values(merged_df):
+    """
+    Calculate G(H+) for every (Method, Basis, Base_Molecule) in one pass.
+
+    For each molecule the form with minimal g_a - g_ha (deprotonated) or
+    g_ha - g_h2a (protonated) is selected. Molecules with experimental pKa
+    whose form has no complete energies are reported.
+    """
+    keys = ["Method", "Basis", "Base_Molecule"]
+    frames = []
+
+    for form, g_col in (("deprotonated", "G_D"), ("protonated", "G_P")):
+        data = merged_df.dropna(subset=["G_N", g_col, "pKa (exp)"])
+        if form == "deprotonated":
+            delta_g = data[g_col] - data["G_N"]
+        else:
+            delta_g = data["G_N"] - data[g_col]
+
+        min_idx = delta_g.groupby([data[k] for k in keys]).idxmin()
+        row = data.loc[min_idx.to_numpy()]
+
+        g_ha = row["G_N"] * HARTREE_TO_KJ
+        g_x = row[g_col] * HARTREE_TO_KJ
+        pka = row["pKa (exp)"]
+        if form == "deprotonated":
+            g_h = pka * RT_in10 + g_ha - g_x
+        else:
+            g_h = pka * RT_in10 + g_x - g_ha
+
+        frames.append(pd.DataFrame({
+            "Method": row["Method"].to_numpy(),
+            "Basis": row["Basis"].to_numpy(),
+            "Calculation_Form": form,
+            "Base_Molecule": row["Base_Molecule"].to_numpy(),
+            "Selected_Molecule": row["Molecule"].to_numpy(),
+            "G(H+) (kJ/mol)": g_h.to_numpy(),
+        }))
+
+        expected = merged_df[(merged_df["Calculation_Form"] == form) & merged_df["pKa (exp)"].notna()]
+        expected = expected[keys].drop_duplicates()
+        failed = expected[~pd.MultiIndex.from_frame(expected).isin(min_idx.index)]
+        for method, basis, base_mol in failed.itertuples(index=False):
+            print(f"Warning: no G(H+) for {base_mol} ({method}/{basis}, {form}): missing energies")
+
+    # deprotonated entries go before protonated ones within each Method/Basis
+    gh_df = pd.concat(frames, ignore_index=True)
+    return gh_df.sort_values(["Method", "Basis"], kind="stable").reset_index(drop=True)
 
 def calculate_pka_deprotonated(g_ha, g_a, g_h):
     delta_g = g_a + g_h - g_ha
@@ -38,13 +65,33 @@ def calculate_pka_protonated(g_ha, g_h2a, g_h):
     delta_g = g_ha + g_h - g_h2a
     return delta_g / RT_in10
 
-def analyze_results(results_dir, experimental_file, output_dir, name_file):
-    print(f"Analyzing results from {results_dir}")
-    output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True)
+def assign_pka(merged_df, gh_df):
+    """Calculate pKa for every row using mean G(H+) of its (Method, Basis, Calculation_Form)"""
+    keys = ["Method", "Basis", "Calculation_Form"]
+    gh_mean = (
+        gh_df.groupby(keys)["G(H+) (kJ/mol)"].mean()
+             .rename("GH_mean")
+             .reset_index()
+    )
+    gh = merged_df[keys].merge(gh_mean, on=keys, how="left")["GH_mean"].to_numpy()
+
+    form = merged_df["Calculation_Form"].to_numpy()
+    g_n = merged_df["G_N"].to_numpy(dtype=float) * HARTREE_TO_KJ
+    g_d = merged_df["G_D"].to_numpy(dtype=float) * HARTREE_TO_KJ
+    g_p = merged_df["G_P"].to_numpy(dtype=float) * HARTREE_TO_KJ
+
+    pka = np.full(len(merged_df), np.nan)
+    deprot = form == "deprotonated"
+    prot = form == "protonated"
+    pka[deprot] = calculate_pka_deprotonated(g_n[deprot], g_d[deprot], gh[deprot])
+    pka[prot] = calculate_pka_protonated(g_n[prot], g_p[prot], gh[prot])
 
-    results_df = pd.read_csv(Path(results_dir) / f"results_{name_file}.csv", sep=';')
-    exp_df = pd.read_csv(experimental_file, sep=';')[['Molecule', 'pKa (exp)']].dropna()
+    return pd.Series(pka, index=merged_df.index)
+
+def compute_pka_tables(results_df, exp_df):
+    """Return the gh_values, gh_stats and pka tables for results and experimental pKa"""
+    results_df = results_df.copy()
+    exp_df = exp_df[['Molecule', 'pKa (exp)']].dropna()
 
     results_df['Molecule'] = results_df['Molecule'].astype(str)
     exp_df['Molecule'] = exp_df['Molecule'].astype(str)
@@ -55,37 +102,7 @@ def analyze_results(results_dir, experimental_file, output_dir, name_file):
     merged_df = pd.merge(results_df, exp_df[['Base_Molecule', 'pKa (exp)']],
                          on='Base_Molecule', how='left')
 
-    gh_entries = []
-
-    for (method, basis), group in merged_df.groupby(["Method", "Basis"]):
-        # deprotonated
-        deprot = group.dropna(subset=['G_N', 'G_D', 'pKa (exp)']).copy()
-        for base_mol, mol_group in deprot.groupby("Base_Molecule"):
-            try:
-                gh, idx, sel_mol = calculate_gh_for_molecule_deprotonated(mol_group)
-                gh_entries.append({
-                    "Method": method, "Basis": basis, "Calculation_Form": "deprotonated",
-                    "Base_Molecule": base_mol, "Selected_Molecule": sel_mol,
-                    "G(H+) (kJ/mol)": gh
-                })
-            except: 
-                pass
-
-        # protonated
-        prot = group.dropna(subset=['G_N', 'G_P', 'pKa (exp)']).copy()
-        for base_mol, mol_group in prot.groupby("Base_Molecule"):
-            try:
-                gh, idx, sel_mol = calculate_gh_for_molecule_protonated(mol_group)
-                gh_entries.append({
-                    "Method": method, "Basis": basis, "Calculation_Form": "protonated",
-                    "Base_Molecule": base_mol, "Selected_Molecule": sel_mol,
-                    "G(H+) (kJ/mol)": gh
-                })
-            except:
-                pass
-
-    gh_df = pd.DataFrame(gh_entries)
-    gh_df.to_csv(output_dir / f"gh_values_{name_file}.csv", sep=";", index=False)
+    gh_df = extract_gh_values(merged_df)
 
     gh_stats = (
         gh_df.groupby(["Method", "Basis", "Calculation_Form"])
@@ -98,30 +115,31 @@ def analyze_results(results_dir, experimental_file, output_dir, name_file):
              )
              .reset_index()
     )
-    gh_stats.to_csv(output_dir / f"gh_stats_{name_file}.csv", sep=";", index=False)
-
-    merged_df["pKa_calc"] = np.nan
-    
-    for idx, row in merged_df.iterrows():
-        gh_candidates = gh_df[
-            (gh_df["Method"] == row.Method) &
-            (gh_df["Basis"] == row.Basis) &
-            (gh_df["Calculation_Form"] == row.Calculation_Form)
-        ]
-        if gh_candidates.empty:
-            continue
-    
-        gh_mean = gh_candidates["G(H+) (kJ/mol)"].mean()
-    
-        if row.Calculation_Form == "deprotonated" and pd.notna(row.G_N) and pd.notna(row.G_D):
-            g_ha = row.G_N * HARTREE_TO_KJ
-            g_a  = row.G_D * HARTREE_TO_KJ
-            merged_df.at[idx, "pKa_calc"] = calculate_pka_deprotonated(g_ha, g_a, gh_mean)
-    
-        elif row.Calculation_Form == "protonated" and pd.notna(row.G_N) and pd.notna(row.G_P):
-            g_ha  = row.G_N * HARTREE_TO_KJ
-            g_h2a = row.G_P * HARTREE_TO_KJ
-            merged_df.at[idx, "pKa_calc"] = calculate_pka_protonated(g_ha, g_h2a, gh_mean)
-            
-    merged_df.to_csv(output_dir / f"pka_{name_file}.csv", sep=";", index=False)
-    print(f"Saved pKa results to {output_dir}/pka_{name_file}.csv")
\ No newline at end of file
+
+    merged_df["pKa_calc"] = assign_pka(merged_df, gh_df)
+    return gh_df, gh_stats, merged_df
+
+def save_pka_tables(gh_df, gh_stats, pka_df, output_dir, name_file, table_format='csv'):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
+    write_table(gh_df, output_dir, f"gh_values_{name_file}", table_format)
+    write_table(gh_stats, output_dir, f"gh_stats_{name_file}", table_format)
+    pka_file = write_table(pka_df, output_dir, f"pka_{name_file}", table_format)
+    print(f"Saved pKa results to {pka_file}")
+
+def analyze_results(results_dir, experimental_file, output_dir, name_file, table_format='csv',
+                    results_df=None, save=True):
+    """
+    Compute G(H+) and pKa tables, save them if save and return (gh_values, gh_stats, pka).
+    The results table is read from results_dir unless results_df is given.
+    """
+    print(f"Analyzing results from {results_dir if results_df is None else 'memory'}")
+
+    if results_df is None:
+        results_df = read_table(results_dir, f"results_{name_file}", table_format)
+    exp_df = pd.read_csv(experimental_file, sep=';')
+
+    gh_df, gh_stats, pka_df = compute_pka_tables(results_df, exp_df)
+    if save:
+        save_pka_tables(gh_df, gh_stats, pka_df, output_dir, name_file, table_format)
+    return gh_df, gh_stats, pka_df
@@ -1,7 +1,15 @@
 import os
+import csv
+import getpass
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import re
+from .processor import parse_output
+from .monitor import get_squeue_output, parse_squeue
+from .geometry import find_duplicate_structures, write_aliases
+from . import manifest
 
 METHOD_TEMPLATES = {
     'HF': "! HF {basis} TightSCF CPCM(water) OPT Freq",
@@ -56,7 +64,53 @@ ELECTRON_COUNT = {
     'F': 9, 'Li': 2, 'S': 16,
 }
 
-def calculate_multiplicity(xyz_file, charge=0):
+# Rough relative cost of a calculation: prefactor * n_electrons ** exponent
+METHOD_COST = {
+    'PM3': (0.01, 2),
+    'AM1': (0.01, 2),
+    'HF': (1.0, 3),
+    'HF-Gdp': (1.0, 3),
+    'LSDA': (1.0, 3),
+    'PBE': (1.0, 3),
+    'B3LYP': (2.0, 3),
+    'B3LYP-D3': (2.0, 3),
+    'B3LYP-D3-Gdp': (2.0, 3),
+    'B3LYP-D3-Gdfp': (3.0, 3),
+    'PBE0': (2.0, 3),
+    'M062X': (2.5, 3),
+    'CAM-B3LYP': (2.5, 3),
+    'WB97X-D3': (2.5, 3),
+    'WB97X-D3-Gdp': (2.5, 3),
+    'MP2': (0.05, 5),
+    'DLPNO-CCSDT': (200.0, 3),  # near-linear scaling, but large prefactor and numerical frequencies
+    'CCSDT': (0.001, 7),
+}
+DEFAULT_METHOD_COST = (2.0, 3)
+
+# Parallel resources per method class: (max processes, memory per process in MB)
+RESOURCE_CLASSES = {
+    'semiempirical': (1, 1000),
+    'dft': (4, 2000),
+    'hybrid': (8, 2500),
+    'correlated': (16, 4000),
+}
+METHOD_CLASS = {
+    'PM3': 'semiempirical', 'AM1': 'semiempirical',
+    'HF': 'dft', 'HF-Gdp': 'dft', 'LSDA': 'dft', 'PBE': 'dft',
+    'MP2': 'correlated', 'DLPNO-CCSDT': 'correlated', 'CCSDT': 'correlated',
+}
+DEFAULT_METHOD_CLASS = 'hybrid'
+ATOMS_PER_PROCESS = 4
+# %maxcore of the class is for molecules up to MAXCORE_ELECTRONS electrons and grows
+# in proportion above that, up to MAXCORE_MAX_FACTOR times
+MAXCORE_ELECTRONS = 100
+MAXCORE_MAX_FACTOR = 4
+MEMORY_OVERHEAD = 1.25  # ORCA may use more than %maxcore, leave headroom for the job allocation
+ARRAY_MAX_SIZE = 1001  # Slurm's default MaxArraySize: larger campaigns are split into several arrays
+
+def read_xyz_composition(xyz_file):
+    """Return (number of atoms, number of electrons of the neutral structure) of xyz file"""
+    n_atoms = 0
     total_electrons = 0
     with open(xyz_file, 'r') as f:
         lines = f.readlines()
@@ -65,13 +119,47 @@ def calculate_multiplicity(xyz_file, charge=0):
     for line in atoms:
         if not line.strip(): continue
         symbol = line.split()[0]
+        n_atoms += 1
         total_electrons += ELECTRON_COUNT.get(symbol, 0)
 
-    total_electrons -= charge
+    return n_atoms, total_electrons
+
+def multiplicity_from_electrons(total_electrons):
     unpaired_electrons = total_electrons % 2
     multiplicity = 2 * unpaired_electrons*1/2 + 1
     return int(multiplicity)
 
+def calculate_multiplicity(xyz_file, charge=0):
+    _, total_electrons = read_xyz_composition(xyz_file)
+    return multiplicity_from_electrons(total_electrons - charge)
+
+def estimate_cost(method, n_electrons):
+    """Relative predicted wall time of one calculation"""
+    prefactor, exponent = METHOD_COST.get(method, DEFAULT_METHOD_COST)
+    return prefactor * max(n_electrons, 1) ** exponent
+
+def plan_resources(method, n_atoms, max_procs=1, n_electrons=0):
+    """Choose ORCA nprocs and maxcore (MB) for a calculation from molecule size and method class"""
+    class_procs, maxcore = RESOURCE_CLASSES[METHOD_CLASS.get(method, DEFAULT_METHOD_CLASS)]
+    nprocs = -(-max(n_atoms, 1) // ATOMS_PER_PROCESS)
+    nprocs = max(1, min(nprocs, class_procs, max_procs))
+    scale = min(max(1.0, n_electrons / MAXCORE_ELECTRONS), MAXCORE_MAX_FACTOR)
+    maxcore = int(round(maxcore * scale, -2))
+    return {'nprocs': nprocs, 'maxcore': maxcore}
+
+def format_resources(resources):
+    return f"""
+%pal
+   nprocs {resources['nprocs']}
+end
+%maxcore {resources['maxcore']}
+"""
+
+def job_memory_mb(calculations):
+    """Memory for the Slurm allocation running all calculations at once"""
+    total = sum(calc['resources']['nprocs'] * calc['resources']['maxcore'] for calc in calculations)
+    return int(total * MEMORY_OVERHEAD)
+
 def get_molecule_forms(xyz_dir):
     """
     Определяет все формы для каждой молекулы
@@ -112,21 +200,109 @@ def get_molecule_forms(xyz_dir):
     
     return molecules
 
-def generate_calculations(xyz_dir, basis, methods, output_dir, forms=None, tasks_per_node=16):
+def form_charge(form_name):
+    """Charge of a form; site forms are named <site>_deprotonated / <site>_protonated"""
+    if form_name.endswith("deprotonated"):
+        return -1
+    if form_name.endswith("protonated"):
+        return 1
+    return 0
+
+def find_duplicate_forms(molecules, tolerance):
+    """Map duplicate (molecule, form) structures of the batch to the first equal one"""
+    structures = []
+    for base_name, molecule_data in molecules.items():
+        if molecule_data['neutral']:
+            structures.append(((base_name, "neutral"), molecule_data['neutral'], 0))
+        for form_name, form_path in molecule_data['forms'].items():
+            structures.append(((base_name, form_name), form_path, form_charge(form_name)))
+    # sorted, so the representative of duplicates does not depend on directory order
+    return find_duplicate_structures(sorted(structures), tolerance)
+
+def load_previous_jobs(output_dir):
+    """Map (Molecule, Method, Basis, Form) -> last Job ID from calculations_summary_*.csv in output_dir"""
+    jobs = {}
+    summaries = sorted(Path(output_dir).glob("calculations_summary_*.csv"), key=lambda p: p.stat().st_mtime)
+    for summary in summaries:
+        with open(summary, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                key = (row.get('Molecule'), row.get('Method'), row.get('Basis'), row.get('Form'))
+                jobs[key] = row.get('Job ID')
+    return jobs
+
+def get_active_jobs():
+    """Map Job ID -> squeue state for jobs of the current user (array tasks as <job>_<task>)"""
+    output = get_squeue_output(getpass.getuser())
+    if output is None:
+        # without squeue, queued jobs would look finished and be submitted again
+        raise RuntimeError("squeue failed: cannot tell which earlier jobs are still queued, try --resume again later")
+    return {job["JOBID"]: job["ST"] for job in parse_squeue(output)}
+
+def check_previous_calculation(method_dir, job_id, active_jobs):
+    """
+    State of an earlier calculation in method_dir: 'Completed', 'Running', 'Pending',
+    or None if it is missing, crashed or unconverged and has to be submitted again.
+    """
+    output_file = method_dir / "output.out"
+    if output_file.exists():
+        gibbs, _, terminated = parse_output(output_file)
+        if terminated and gibbs is not None:
+            return "Completed"
+
+    state = active_jobs.get(str(job_id)) if job_id else None
+    if state == "R":
+        return "Running"
+    if state is not None:
+        return "Pending"
+    return None
+
+def generate_calculations(xyz_dir, basis, methods, output_dir, forms=None, tasks_per_node=16,
+                          array=False, array_limit=None, grouping='count', cores_per_node=None,
+                          resume=False, executor='slurm', local_workers=None, dedup=True,
+                          dedup_tolerance=0.05, array_max=ARRAY_MAX_SIZE):
     molecules = get_molecule_forms(xyz_dir)
     
     output_dir = Path(output_dir).absolute()
     output_dir.mkdir(parents=True, exist_ok=True)
 
     summary_file = output_dir / f"calculations_summary_{basis}_{'_'.join(methods)}.csv"
+
+    kept_calculations = []
+    if resume:
+        previous_jobs = load_previous_jobs(output_dir)
+        # local runs are finished when calculate returns, nothing can still be queued
+        active_jobs = get_active_jobs() if executor == 'slurm' else {}
     
     with open(summary_file, 'w', encoding='utf-8') as sf:
         sf.write("Molecule;Method;Basis;Form;Job ID;Status\n")
+
+    # duplicate structures are calculated once, process copies the energies to their aliases
+    aliases = find_duplicate_forms(molecules, dedup_tolerance) if dedup else {}
+    if dedup:
+        checked = {(base_name, "neutral") for base_name in molecules}
+        checked.update((base_name, form_name) for base_name, data in molecules.items() for form_name in data['forms'])
+        write_aliases(output_dir, basis, aliases, checked)
+        for (base_name, form_name), (alias_base, alias_form) in sorted(aliases.items()):
+            print(f"Duplicate structure: {base_name}/{form_name} is calculated as {alias_base}/{alias_form}")
+            calcs = [{'base_name': base_name, 'method': method, 'basis': basis, 'form': form_name}
+                     for method in methods if method in METHOD_TEMPLATES]
+            write_summary_rows(summary_file, calcs, [''] * len(calcs), f"Alias of {alias_base}/{alias_form}")
     
     all_calculations = []
+
+    # cores available to one calculation: a group shares the node, an array task has it alone
+    if executor == 'local':
+        local_workers = local_workers or os.cpu_count() or 1
+        max_procs = max(1, (cores_per_node or local_workers) // local_workers)
+    elif cores_per_node is None:
+        # without --cores-per-node every calculation keeps one core, as before
+        max_procs = 1
+    else:
+        max_procs = cores_per_node if array else max(1, cores_per_node // tasks_per_node)
     
     for base_name, molecule_data in molecules.items():
-        if molecule_data['neutral']:
+        if molecule_data['neutral'] and (base_name, "neutral") not in aliases:
+            n_atoms, n_electrons = read_xyz_composition(molecule_data['neutral'])
             for method in methods:
                 if method not in METHOD_TEMPLATES:
                     continue
@@ -135,12 +311,23 @@ def generate_calculations(xyz_dir, basis, methods, output_dir, forms=None, tasks
                 method_dir = output_dir / basis / base_name / "neutral" / method_name
                 method_dir.mkdir(parents=True, exist_ok=True)
 
+                if resume:
+                    job_id = previous_jobs.get((base_name, method_name, basis, "neutral"))
+                    state = check_previous_calculation(method_dir, job_id, active_jobs)
+                    if state:
+                        calc = {'base_name': base_name, 'method': method_name, 'basis': basis, 'form': "neutral"}
+                        kept_calculations.append((calc, job_id or '', state))
+                        continue
+
                 charge = 0
-                multiplicity = calculate_multiplicity(molecule_data['neutral'], charge=charge)
+                multiplicity = multiplicity_from_electrons(n_electrons - charge)
                 
+                resources = plan_resources(method, n_atoms, max_procs, n_electrons)
+
                 input_file = method_dir / "input.inp"
                 with open(input_file, 'w', encoding='utf-8') as f:
                     f.write(METHOD_TEMPLATES[method].format(basis=basis) + "\n")
+                    f.write(format_resources(resources))
                     f.write(f'''
 %geom  
    MaxIter 200
@@ -155,10 +342,16 @@ end
                     'method': method_name,
                     'basis': basis,
                     'form': "neutral",
-                    'directory': method_dir
+                    'directory': method_dir,
+                    'n_atoms': n_atoms,
+                    'n_electrons': n_electrons - charge,
+                    'resources': resources,
                 })
                         
         for form_name, form_path in molecule_data['forms'].items():
+            if (base_name, form_name) in aliases:
+                continue
+            n_atoms, n_electrons = read_xyz_composition(form_path)
             for method in methods:
                 if method not in METHOD_TEMPLATES:
                     continue
@@ -167,16 +360,24 @@ end
                 method_dir = output_dir / basis / base_name / form_name / method_name
                 method_dir.mkdir(parents=True, exist_ok=True)
 
-                if form_name == "deprotonated":
-                    charge = -1
-                elif form_name == "protonated":
-                    charge = 1
+                if resume:
+                    job_id = previous_jobs.get((base_name, method_name, basis, form_name))
+                    state = check_previous_calculation(method_dir, job_id, active_jobs)
+                    if state:
+                        calc = {'base_name': base_name, 'method': method_name, 'basis': basis, 'form': form_name}
+                        kept_calculations.append((calc, job_id or '', state))
+                        continue
+
+                charge = form_charge(form_name)
                     
-                multiplicity = calculate_multiplicity(form_path, charge=charge)
+                multiplicity = multiplicity_from_electrons(n_electrons - charge)
                 
+                resources = plan_resources(method, n_atoms, max_procs, n_electrons)
+
                 input_file = method_dir / "input.inp"
                 with open(input_file, 'w', encoding='utf-8') as f:
                     f.write(METHOD_TEMPLATES[method].format(basis=basis) + "\n")
+                    f.write(format_resources(resources))
                     f.write(f'''
 # %cpcm
 #   smd true
@@ -196,12 +397,75 @@ end
                     'method': method_name,
                     'basis': basis,
                     'form': form_name,
-                    'directory': method_dir
+                    'directory': method_dir,
+                    'n_atoms': n_atoms,
+                    'n_electrons': n_electrons - charge,
+                    'resources': resources,
                 })
                     
-    group_calculations(all_calculations, tasks_per_node, summary_file)
+    for calc, job_id, state in kept_calculations:
+        write_summary_rows(summary_file, [calc], [job_id], state)
+
+    statuses = {(c['basis'], c['base_name'], c['form'], c['method']): manifest.PENDING for c in all_calculations}
+    for calc, _, state in kept_calculations:
+        key = (calc['basis'], calc['base_name'], calc['form'], calc['method'])
+        statuses[key] = manifest.FINISHED if state == "Completed" else manifest.PENDING
+    manifest.update_manifest(output_dir, statuses)
+    if resume:
+        print(f"Resume: {len(kept_calculations)} calculations kept "
+              f"(completed, running or pending), {len(all_calculations)} to submit")
 
-def group_calculations(calculations, tasks_per_node, summary_file):
+    EXECUTORS[executor](all_calculations, summary_file, tasks_per_node=tasks_per_node, grouping=grouping,
+                        array=array, array_limit=array_limit, array_max=array_max,
+                        local_workers=local_workers)
+
+    return summary_file
+
+def slurm_executor(calculations, summary_file, tasks_per_node=16, grouping='count',
+                   array=False, array_limit=None, array_max=ARRAY_MAX_SIZE, **options):
+    """Submit calculations to Slurm as node groups or as job arrays"""
+    if array:
+        submit_array_job(calculations, summary_file, array_limit, array_max)
+    else:
+        group_calculations(calculations, tasks_per_node, summary_file, grouping)
+
+def run_local_calculation(calc, orca_path):
+    """Run ORCA in the calculation directory, return the exit code"""
+    with open(Path(calc['directory']) / "output.out", 'w') as out:
+        return subprocess.run([orca_path, "input.inp"], cwd=calc['directory'],
+                              stdout=out, stderr=subprocess.STDOUT).returncode
+
+def local_executor(calculations, summary_file, local_workers=None, **options):
+    """Run calculations on this machine, at most local_workers ORCA processes at a time"""
+    if not calculations:
+        return
+
+    orca_path = shutil.which("orca")
+    if orca_path is None:
+        write_summary_rows(summary_file, calculations, ["Failed"] * len(calculations),
+                           "Local Error: orca not found in PATH")
+        return
+
+    local_workers = local_workers or os.cpu_count() or 1
+    print(f"Running {len(calculations)} calculations locally with {local_workers} workers")
+    with ThreadPoolExecutor(max_workers=local_workers) as pool:
+        futures = [pool.submit(run_local_calculation, calc, orca_path) for calc in calculations]
+        for i, (calc, future) in enumerate(zip(calculations, futures)):
+            try:
+                exit_code = future.result()
+                status = "Completed" if exit_code == 0 else f"Local Error: exit code {exit_code}"
+            except Exception as e:
+                status = f"Unexpected Error: {str(e)}"
+            write_summary_rows(summary_file, [calc], [f"local_{i}"], status)
+
+# name -> function(calculations, summary_file, **options) that runs or submits calculations
+EXECUTORS = {
+    'slurm': slurm_executor,
+    'local': local_executor,
+}
+
+def pack_by_count(calculations, tasks_per_node):
+    """Split calculations into groups of tasks_per_node in input order"""
     groups = []
     current_group = []
     
@@ -213,6 +477,32 @@ def group_calculations(calculations, tasks_per_node, summary_file):
     
     if current_group:
         groups.append(current_group)
+
+    return groups
+
+def pack_by_cost(calculations, tasks_per_node):
+    """
+    Split calculations into groups of tasks_per_node with similar predicted cost.
+
+    All tasks of a group run at once on one node, so the group takes as long as
+    its most expensive task. Filling groups in order of decreasing cost keeps
+    cheap calculations from waiting on expensive ones.
+    """
+    ranked = sorted(
+        calculations,
+        key=lambda calc: estimate_cost(calc['method'], calc.get('n_electrons', 0)),
+        reverse=True
+    )
+    return pack_by_count(ranked, tasks_per_node)
+
+def group_calculations(calculations, tasks_per_node, summary_file, grouping='count'):
+    if grouping == 'cost':
+        groups = pack_by_cost(calculations, tasks_per_node)
+        for i, group in enumerate(groups):
+            costs = [estimate_cost(calc['method'], calc.get('n_electrons', 0)) for calc in group]
+            print(f"Group {i}: {len(group)} calculations, predicted relative wall time {max(costs):.3g}")
+    else:
+        groups = pack_by_count(calculations, tasks_per_node)
     
     for i, group in enumerate(groups):
         submit_group_job(group, i, summary_file)
@@ -221,12 +511,16 @@ def submit_group_job(group, group_id, summary_file):
     script_path = Path(f"orca_group_{group_id}.sh")
     script_content = f"""#!/bin/bash
 #SBATCH --job-name=orca_group_{group_id}
-#SBATCH --ntasks={len(group)}
+#SBATCH --ntasks={sum(calc['resources']['nprocs'] for calc in group)}
 #SBATCH --cpus-per-task=1
+#SBATCH --mem={job_memory_mb(group)}M
 #SBATCH -N 1
 
 start_time=$(date +%s)
 
+# parallel ORCA runs must be started with the full path to the binary
+ORCA=$(command -v orca)
+
 calc_dirs=({" ".join([f'"{calc["directory"]}"' for calc in group])})
 
 run_calculation() {{
@@ -234,7 +528,7 @@ run_calculation() {{
     local calc_dir="${{calc_dirs[$task_id]}}"
     echo "Starting calculation in: $calc_dir (task $task_id)"
     cd "$calc_dir"
-    (orca input.inp > output.out 2>&1) &
+    ("$ORCA" input.inp > output.out 2>&1) &
     exit_code=$?
     echo "Calculation in $calc_dir completed with exit code $exit_code"
     return $exit_code
@@ -267,37 +561,116 @@ echo "Total execution time: $((end_time - start_time)) seconds"
         )
         
         job_id = result.stdout.strip().split()[-1]
-        status = "Submitted"
-        
-        with open(summary_file, 'a', encoding='utf-8') as sf:
-            for calc in group:
-                sf.write(f"{calc['base_name']};{calc['method']};{calc['basis']};{calc['form']};{job_id};{status}\n")
-
+        write_summary_rows(summary_file, group, [job_id] * len(group), "Submitted")
     
     except subprocess.CalledProcessError as e:
-        job_id = "Failed"
-        status = f"Slurm Error: {e.stderr.strip()}"
-        with open(summary_file, 'a', encoding='utf-8') as sf:
-            for calc in group:
-                sf.write(f"{calc['base_name']};{calc['method']};{calc['basis']};{calc['form']};{job_id};{status}\n")
+        write_summary_rows(summary_file, group, ["Failed"] * len(group), f"Slurm Error: {e.stderr.strip()}")
+    except Exception as e:
+        write_summary_rows(summary_file, group, ["Failed"] * len(group), f"Unexpected Error: {str(e)}")
+    finally:
+        if script_path.exists():
+            script_path.unlink()
+
+def write_summary_rows(summary_file, calculations, job_ids, status):
+    with open(summary_file, 'a', encoding='utf-8') as sf:
+        for calc, job_id in zip(calculations, job_ids):
+            sf.write(f"{calc['base_name']};{calc['method']};{calc['basis']};{calc['form']};{job_id};{status}\n")
+
+def submit_array_job(calculations, summary_file, array_limit=None, array_max=ARRAY_MAX_SIZE):
+    """
+    Submit all calculations as Slurm job arrays of at most array_max tasks.
+
+    Task i of the array starting at line offset+1 runs the calculation in line
+    offset+i+1 of the manifest file; at most array_limit tasks of each array run
+    at the same time. Job IDs are recorded per task as <array job id>_<task id>,
+    the same way squeue shows them.
+    """
+    if not calculations:
+        return
+
+    summary_file = Path(summary_file)
+    manifest_name = summary_file.stem.replace("calculations_summary", "array_manifest", 1)
+    manifest_path = summary_file.with_name(f"{manifest_name}.txt")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        f.write("".join(f"{calc['directory']}\n" for calc in calculations))
+
+    array_max = max(1, array_max or ARRAY_MAX_SIZE)
+    for offset in range(0, len(calculations), array_max):
+        submit_array_chunk(calculations[offset:offset + array_max], offset, manifest_path,
+                           summary_file, array_limit)
+
+def submit_array_chunk(calculations, offset, manifest_path, summary_file, array_limit=None):
+    array_spec = f"0-{len(calculations) - 1}"
+    if array_limit:
+        array_spec += f"%{array_limit}"
+
+    script_path = Path("orca_array.sh")
+    script_content = f"""#!/bin/bash
+#SBATCH --job-name=orca_array
+#SBATCH --array={array_spec}
+#SBATCH --ntasks={max(calc['resources']['nprocs'] for calc in calculations)}
+#SBATCH --cpus-per-task=1
+#SBATCH --mem={max(job_memory_mb([calc]) for calc in calculations)}M
+#SBATCH -N 1
+
+calc_dir=$(sed -n "$((SLURM_ARRAY_TASK_ID + {offset + 1}))p" "{manifest_path}")
+echo "Starting calculation in: $calc_dir (task $SLURM_ARRAY_TASK_ID) on $(hostname)"
+cd "$calc_dir" || exit 1
+
+start_time=$(date +%s)
+"$(command -v orca)" input.inp > output.out 2>&1
+exit_code=$?
+end_time=$(date +%s)
+echo "Calculation in $calc_dir completed with exit code $exit_code"
+echo "Total execution time: $((end_time - start_time)) seconds"
+exit $exit_code
+"""
+    with open(script_path, 'w') as f:
+        f.write(script_content)
+    os.chmod(script_path, 0o755)
+
+    try:
+        result = subprocess.run(
+            ['sbatch', str(script_path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True
+        )
+
+        job_id = result.stdout.strip().split()[-1]
+        job_ids = [f"{job_id}_{task_id}" for task_id in range(len(calculations))]
+        write_summary_rows(summary_file, calculations, job_ids, "Submitted")
+
+    except subprocess.CalledProcessError as e:
+        write_summary_rows(summary_file, calculations, ["Failed"] * len(calculations), f"Slurm Error: {e.stderr.strip()}")
     except Exception as e:
-        job_id = "Failed"
-        status = f"Unexpected Error: {str(e)}"
-        with open(summary_file, 'a', encoding='utf-8') as sf:
-            for calc in group:
-                sf.write(f"{calc['base_name']};{calc['method']};{calc['form']};{job_id};{status}\n")
+        write_summary_rows(summary_file, calculations, ["Failed"] * len(calculations), f"Unexpected Error: {str(e)}")
     finally:
         if script_path.exists():
             script_path.unlink()
 
-def calculate_pka(xyz_dir, basis, methods, output_dir, forms=None, tasks_per_node=32):
+def calculate_pka(xyz_dir, basis, methods, output_dir, forms=None, tasks_per_node=32,
+                  array=False, array_limit=None, grouping='count', cores_per_node=None,
+                  resume=False, executor='slurm', local_workers=None, dedup=True,
+                  dedup_tolerance=0.05, array_max=ARRAY_MAX_SIZE):
     """Main function to calculate pKa values"""
     print(f"Starting pKa calculations for molecules in {xyz_dir}")
     print(f"Using basis set: {basis}")
     print(f"Methods: {', '.join(methods)}")
     print(f"Output directory: {output_dir}")
-    print(f"Tasks per node: {tasks_per_node}")
+    if executor == 'local':
+        print(f"Submission: local ({local_workers or os.cpu_count()} workers)")
+    elif array:
+        print(f"Submission: job arrays of up to {array_max} tasks "
+              f"(max concurrent tasks per array: {array_limit or 'unlimited'})")
+    else:
+        print(f"Tasks per node: {tasks_per_node} (grouping by {grouping})")
+    if executor == 'slurm':
+        print(f"Cores per node: {cores_per_node or 'not set (one core per calculation)'}")
     
-    generate_calculations(xyz_dir, basis, methods, output_dir, forms, tasks_per_node)
+    generate_calculations(xyz_dir, basis, methods, output_dir, forms, tasks_per_node,
+                          array, array_limit, grouping, cores_per_node, resume,
+                          executor, local_workers, dedup, dedup_tolerance, array_max)
     
     print("Calculations submitted successfully!")
\ No newline at end of file
@@ -0,0 +1,174 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# Linear calibration pKa_calc = Slope * pKa_exp + Intercept, fitted for all
+# groups at once on a (groups x points) array padded with zero weights.
+BOOTSTRAP_SAMPLES = 1000
+CONFIDENCE = 0.95
+BATCH_ELEMENTS = 4_000_000  # bootstrap samples are drawn in batches of at most this many values
+STAT_COLUMNS = ["N", "Slope", "Intercept", "R2", "MAE_calc", "MAE_calibrated", "MAE_LOO",
+                "Slope_CI_low", "Slope_CI_high", "Intercept_CI_low", "Intercept_CI_high",
+                "MAE_CI_low", "MAE_CI_high"]
+# statistics of the fitting procedure, undefined for a line given by the user
+FIT_ONLY_COLUMNS = ["MAE_LOO", "Slope_CI_low", "Slope_CI_high", "Intercept_CI_low", "Intercept_CI_high",
+                    "MAE_CI_low", "MAE_CI_high"]
+# spread of x below this fraction of n*sxx is round-off: fewer than two distinct x values
+DEGENERATE_SPREAD = 1e-12
+
+
+def pad_groups(df, group_columns, x_column, y_column):
+    """Return (keys, x, y, mask): one row per group, padded with zeros to the largest group"""
+    data = df.dropna(subset=[x_column, y_column])
+    groups = data.groupby(group_columns, sort=False)
+    codes = groups.ngroup().to_numpy()
+    position = groups.cumcount().to_numpy()
+    keys = list(data[group_columns].drop_duplicates().itertuples(index=False, name=None))
+
+    shape = (len(keys), position.max() + 1 if len(position) else 0)
+    x = np.zeros(shape)
+    y = np.zeros(shape)
+    mask = np.zeros(shape)
+    x[codes, position] = data[x_column].to_numpy(dtype=float)
+    y[codes, position] = data[y_column].to_numpy(dtype=float)
+    mask[codes, position] = 1
+    return keys, x, y, mask
+
+
+def line_fits(x, y, w):
+    """
+    Weighted least-squares lines over the last axis; w broadcasts against x and y.
+    Lines through fewer than two distinct x values are NaN.
+    """
+    n = w.sum(-1)
+    sx = (w * x).sum(-1)
+    sy = (w * y).sum(-1)
+    sxx = (w * x * x).sum(-1)
+    sxy = (w * x * y).sum(-1)
+    spread = n * sxx - sx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(spread > DEGENERATE_SPREAD * n * sxx, (n * sxy - sx * sy) / spread, np.nan)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept
+
+
+def calibrated_mae(x, y, w, slope, intercept):
+    calibrated = (y - intercept[..., None]) / slope[..., None]
+    return (w * np.abs(calibrated - x)).sum(-1) / w.sum(-1)
+
+
+def bootstrap(x, y, mask, samples, rng):
+    """Slope, intercept and calibrated MAE of samples resamples of every group, shape (samples, groups)"""
+    n_groups, n_points = x.shape
+    n = mask.sum(-1).astype(int)
+    batch = max(1, BATCH_ELEMENTS // max(1, n_groups * n_points))
+
+    slopes, intercepts, maes = [], [], []
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        # resampling with replacement = multinomial counts used as weights
+        idx = (rng.random((size, n_groups, n_points)) * n[:, None]).astype(int)
+        valid = np.broadcast_to(mask.astype(bool), idx.shape)
+        flat = (np.arange(size * n_groups).reshape(size, n_groups, 1) * n_points + idx)[valid]
+        counts = np.bincount(flat, minlength=size * n_groups * n_points).reshape(size, n_groups, n_points)
+
+        slope, intercept = line_fits(x, y, counts)
+        slopes.append(slope)
+        intercepts.append(intercept)
+        maes.append(calibrated_mae(x, y, counts, slope, intercept))
+    return np.concatenate(slopes), np.concatenate(intercepts), np.concatenate(maes)
+
+
+def leave_one_out_mae(x, y, mask):
+    """Mean |calibrated - exp| of each point predicted with the line fitted without it"""
+    n = mask.sum(-1, keepdims=True)
+    sums = [(mask * v).sum(-1, keepdims=True) for v in (x, y, x * x, x * y)]
+    sx, sy, sxx, sxy = (s - v for s, v in zip(sums, (x, y, x * x, x * y)))
+    m = n - 1
+    spread = m * sxx - sx ** 2
+    slope = np.where(spread > DEGENERATE_SPREAD * m * sxx, (m * sxy - sx * sy) / spread, np.nan)
+    intercept = (sy - slope * sx) / m
+    errors = np.where(mask > 0, np.abs((y - intercept) / slope - x), 0)
+    mae = errors.sum(-1) / n[:, 0]
+    return np.where(n[:, 0] >= 3, mae, np.nan)
+
+
+def fit_calibrations(df, group_columns, x_column="pKa (exp)", y_column="pKa_calc",
+                     samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, seed=0):
+    """
+    Fit the calibration line of every group of df and return one row per group with
+    STAT_COLUMNS: the fit, R², MAE before and after calibration, leave-one-out MAE and
+    bootstrap confidence intervals of slope, intercept and calibrated MAE.
+    Groups with fewer than two points get NaN statistics.
+    """
+    keys, x, y, mask = pad_groups(df, group_columns, x_column, y_column)
+    fits = pd.DataFrame(keys, columns=group_columns)
+    if not keys:
+        return fits.reindex(columns=group_columns + STAT_COLUMNS)
+
+    n = mask.sum(-1)
+    # groups with < 2 (or, resampled, identical) points give NaN/inf, masked below
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        slope, intercept = line_fits(x, y, mask)
+        fitted = n >= 2
+        slope = np.where(fitted, slope, np.nan)
+        intercept = np.where(fitted, intercept, np.nan)
+
+        sx, sy = (mask * x).sum(-1), (mask * y).sum(-1)
+        sxx, syy, sxy = (mask * x * x).sum(-1), (mask * y * y).sum(-1), (mask * x * y).sum(-1)
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+
+        boot_slope, boot_intercept, boot_mae = bootstrap(x, y, mask, samples, np.random.default_rng(seed))
+        tails = [100 * (1 - confidence) / 2, 100 * (1 + confidence) / 2]
+
+        fits["N"] = n.astype(int)
+        fits["Slope"] = slope
+        fits["Intercept"] = intercept
+        fits["R2"] = np.where(fitted, r ** 2, np.nan)
+        fits["MAE_calc"] = (mask * np.abs(y - x)).sum(-1) / n
+        fits["MAE_calibrated"] = calibrated_mae(x, y, mask, slope, intercept)
+        fits["MAE_LOO"] = leave_one_out_mae(x, y, mask)
+        for name, values in (("Slope", boot_slope), ("Intercept", boot_intercept), ("MAE", boot_mae)):
+            low, high = np.nanpercentile(np.where(np.isfinite(values), values, np.nan), tails, axis=0)
+            fits[f"{name}_CI_low"] = np.where(fitted, low, np.nan)
+            fits[f"{name}_CI_high"] = np.where(fitted, high, np.nan)
+    return fits
+
+
+def replace_lines(df, fits, lines, group_columns, x_column="pKa (exp)", y_column="pKa_calc"):
+    """
+    Return fits with Slope and Intercept of the groups in lines (a table of group_columns,
+    Slope and Intercept) replaced. R2 and MAE_calibrated of those groups are recomputed
+    for the given line; leave-one-out MAE and bootstrap CIs become NaN.
+    """
+    lines = lines.drop_duplicates(group_columns, keep="last")
+    fits = fits.merge(lines[group_columns + ["Slope", "Intercept"]], on=group_columns,
+                      how="left", suffixes=("", "_given"))
+    given = fits["Slope_given"].notna().to_numpy()
+    fits.loc[given, "Slope"] = fits.loc[given, "Slope_given"]
+    fits.loc[given, "Intercept"] = fits.loc[given, "Intercept_given"]
+    fits = fits.drop(columns=["Slope_given", "Intercept_given"])
+    if not given.any():
+        return fits
+
+    keys, x, y, mask = pad_groups(df, group_columns, x_column, y_column)
+    # groups without data point to an empty row appended at the end
+    x, y, mask = (np.vstack([a, np.zeros((1, a.shape[1]))]) for a in (x, y, mask))
+    rows = {key: i for i, key in enumerate(keys)}
+    replaced = fits[given]
+    index = np.array([rows.get(key, -1) for key in replaced[group_columns].itertuples(index=False, name=None)],
+                     dtype=int)
+    x, y, mask = x[index], y[index], mask[index]
+    slope = replaced["Slope"].to_numpy(dtype=float)
+    intercept = replaced["Intercept"].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = mask.sum(-1)
+        residual = (mask * (y - slope[:, None] * x - intercept[:, None]) ** 2).sum(-1)
+        mean_y = (mask * y).sum(-1) / n
+        total = (mask * (y - mean_y[:, None]) ** 2).sum(-1)
+        fits.loc[given, "R2"] = np.where(n >= 2, 1 - residual / total, np.nan)
+        fits.loc[given, "MAE_calibrated"] = calibrated_mae(x, y, mask, slope, intercept)
+    fits.loc[given, FIT_ONLY_COLUMNS] = np.nan
+    return fits
@@ -1,14 +1,6 @@
 import argparse
+import getpass
 from pathlib import Path
-from .calculator import calculate_pka
-from .processor import process_results
-from .analyzer import analyze_results
-from .visualizer import visualize_results
-from .monitor import monitor_jobs
-from .deprotonator import process_deprotonation
-from .equilibrator import process_equilibrated
-from .interactive import make_interactive_html
-from .min_pka import extract_min_pka
 
 def main():
     parser = argparse.ArgumentParser(description='pKa Calculator Tool')
@@ -26,6 +18,29 @@ def main():
                            help='Output directory (full)')
     calc_parser.add_argument('-f', '--forms', nargs='+', choices=['neutral', 'deprotonated'],
                            help='Forms to calculate (neutral, deprotonated, or both if not specified)')
+    calc_parser.add_argument('-t', '--tasks-per-node', type=int, default=32,
+                           help='Number of calculations per node group')
+    calc_parser.add_argument('-g', '--grouping', choices=['count', 'cost'], default='count',
+                           help='Group calculations in input order (count) or by predicted cost (cost)')
+    calc_parser.add_argument('-c', '--cores-per-node', type=int, default=None,
+                           help='CPU cores per node shared by a group; sets ORCA %%pal/%%maxcore and job resources '
+                                '(default: one core per task)')
+    calc_parser.add_argument('--resume', action='store_true',
+                           help='Skip completed, running and pending calculations; resubmit only the rest')
+    calc_parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                           help='Calculate duplicate structures separately')
+    calc_parser.add_argument('--dedup-tol', type=float, default=0.05,
+                           help='RMSD (Angstrom) below which structures with equal charge are duplicates')
+    calc_parser.add_argument('--executor', choices=['slurm', 'local'], default='slurm',
+                           help='Submit to Slurm or run ORCA on this machine')
+    calc_parser.add_argument('--local-workers', type=int, default=None,
+                           help='Concurrent ORCA processes for --executor local (default: CPU count)')
+    calc_parser.add_argument('--array', action='store_true',
+                           help='Submit all calculations as one Slurm job array instead of node groups')
+    calc_parser.add_argument('--array-limit', type=int, default=None,
+                           help='Maximum number of array tasks running at once (sbatch --array=0-N%%K)')
+    calc_parser.add_argument('--array-max', type=int, default=1001,
+                           help="Largest job array (the cluster's MaxArraySize); more calculations are split into several arrays")
 
     # Monitor command
     mon_parser = subparsers.add_parser('monitor', help='Monitor running jobs')
@@ -33,6 +48,10 @@ def main():
                            help='Path to calculations_summary.txt')
     mon_parser.add_argument('-u', '--user', default='vandyshev',
                            help='Name of user')
+    mon_parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                           help='Poll squeue every SECONDS (with backoff) and redraw only on changes')
+    mon_parser.add_argument('--json', action='store_true',
+                           help='Print jobs as JSON (one object per update)')
 
     # Deprotonation comand
     depro_parser = subparsers.add_parser('deprotonate', help='Interactive creation of deprotonated molecules')
@@ -40,6 +59,19 @@ def main():
                             help='Directory with calculations (contains basis set directories)')
     depro_parser.add_argument('-o', '--output', default='deprotonated',
                             help='Output directory for deprotonated molecules')
+    depro_parser.add_argument('-b', '--basis', default=None,
+                            help='Basis set to use (asked interactively if not given)')
+    depro_parser.add_argument('-m', '--method', default=None,
+                            help='Method to use (asked interactively if not given)')
+    depro_parser.add_argument('--all', action='store_true',
+                            help='Process every basis/method, each into OUTPUT/<basis>/<method>')
+    depro_parser.add_argument('-w', '--workers', type=int, default=1,
+                            help='Number of parallel workers (1 = serial)')
+    depro_parser.add_argument('-k', '--top-k', type=int, default=1,
+                            help='Create forms for the k most positive non-equivalent hydrogens '
+                                 '(<molecule>_H<id>_deprotonated.xyz)')
+    depro_parser.add_argument('--rescan', action='store_true',
+                            help='Rebuild the calculation manifest by scanning the directory tree')
 
     # Processing command
     proc_parser = subparsers.add_parser('process', help='Process calculation results')
@@ -49,6 +81,18 @@ def main():
                            help='Output directory')
     proc_parser.add_argument('-n', '--name_file', default='basis',
                            help='Name of output file (basis)')
+    proc_parser.add_argument('-w', '--workers', type=int, default=1,
+                           help='Number of parallel workers for parsing outputs (1 = serial)')
+    proc_parser.add_argument('--pool', choices=['process', 'thread'], default='process',
+                           help='Worker pool type (thread is enough for I/O-bound runs)')
+    proc_parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                           help='Parse every output.out, ignoring the parse cache')
+    proc_parser.add_argument('--rebuild-cache', action='store_true',
+                           help='Drop the parse cache and parse every output.out again')
+    proc_parser.add_argument('--rescan', action='store_true',
+                           help='Rebuild the calculation manifest by scanning the directory tree')
+    proc_parser.add_argument('--format', dest='table_format', choices=['csv', 'parquet', 'feather'], default='csv',
+                           help='Format of the results table (parquet/feather need pyarrow)')
 
     # Analysis command
     anal_parser = subparsers.add_parser('analyze', help='Analyze results')
@@ -60,6 +104,8 @@ def main():
                            help='Output directory')
     anal_parser.add_argument('-n', '--name_file', default='basis',
                            help='Name of output file (basis)')
+    anal_parser.add_argument('--format', dest='table_format', choices=['csv', 'parquet', 'feather'], default='csv',
+                           help='Format of the results and pKa tables (parquet/feather need pyarrow)')
 
     # Visualization command
     vis_parser = subparsers.add_parser('visualize', help='Visualize results')
@@ -71,6 +117,10 @@ def main():
                            help='Name of output file (basis)')
     vis_parser.add_argument('-f', '--calibration_file', default='None',
                            help='File with parametrs of calibration')
+    vis_parser.add_argument('--format', dest='table_format', choices=['csv', 'parquet', 'feather'], default='csv',
+                           help='Format of the pka_min table (parquet/feather need pyarrow)')
+    vis_parser.add_argument('-w', '--workers', type=int, default=1,
+                           help='Number of processes rendering the plots')
 
     # Full pipeline command
     pipeline_parser = subparsers.add_parser('pipeline', help='Run full processing pipeline')
@@ -82,6 +132,69 @@ def main():
                                help='Output directory')
     pipeline_parser.add_argument('-n', '--name_file', default='basis',
                                help='Base name for output files')
+    pipeline_parser.add_argument('-w', '--workers', type=int, default=1,
+                               help='Number of parallel workers for parsing outputs and rendering plots (1 = serial)')
+    pipeline_parser.add_argument('--pool', choices=['process', 'thread'], default='process',
+                               help='Worker pool type (thread is enough for I/O-bound runs)')
+    pipeline_parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                               help='Parse every output.out, ignoring the parse cache')
+    pipeline_parser.add_argument('--rebuild-cache', action='store_true',
+                               help='Drop the parse cache and parse every output.out again')
+    pipeline_parser.add_argument('--rescan', action='store_true',
+                               help='Rebuild the calculation manifest by scanning the directory tree')
+    pipeline_parser.add_argument('--format', dest='table_format', choices=['csv', 'parquet', 'feather'], default='csv',
+                               help='Format of the saved tables (parquet/feather need pyarrow)')
+    pipeline_parser.add_argument('--no-tables', dest='save_tables', action='store_false',
+                               help='Keep the intermediate tables in memory only; write just plots and HTML')
+    pipeline_parser.add_argument('-k', '--top-k', type=int, default=1,
+                               help='Keep the k lowest-pKa forms per molecule in pka_min (plots use the lowest)')
+    pipeline_parser.add_argument('--plotlyjs', default='cdn',
+                               help="plotly.js of the HTML report: 'cdn', 'inline' or path to a plotly.js file")
+
+    # Campaign orchestration command
+    orch_parser = subparsers.add_parser('orchestrate', help='Submit calculations and process results as jobs finish')
+    orch_parser.add_argument('xyz_dir',
+                             help='Directory with XYZ files')
+    orch_parser.add_argument('-b', '--basis', default='def2-TZVPP',
+                             help='Basis set')
+    orch_parser.add_argument('-m', '--methods', nargs='+', default=['B3LYP', 'HF', 'PBE0'],
+                             help='Calculation methods')
+    orch_parser.add_argument('-o', '--output', default='mycalculations',
+                             help='Output directory for calculations')
+    orch_parser.add_argument('-r', '--results', default='process',
+                             help='Output directory for results and pKa tables')
+    orch_parser.add_argument('-n', '--name_file', default='basis',
+                             help='Base name for output files')
+    orch_parser.add_argument('-e', '--experimental', default=None,
+                             help='CSV file with experimental pKa values (enables pKa tables)')
+    orch_parser.add_argument('-u', '--user', default=getpass.getuser(),
+                             help='Name of user')
+    orch_parser.add_argument('--poll', type=float, default=60,
+                             help='Seconds between squeue polls')
+    orch_parser.add_argument('-w', '--workers', type=int, default=1,
+                             help='Number of parallel workers for parsing outputs (1 = serial)')
+    orch_parser.add_argument('-t', '--tasks-per-node', type=int, default=32,
+                             help='Number of calculations per node group')
+    orch_parser.add_argument('-g', '--grouping', choices=['count', 'cost'], default='count',
+                             help='Group calculations in input order (count) or by predicted cost (cost)')
+    orch_parser.add_argument('-c', '--cores-per-node', type=int, default=None,
+                             help='CPU cores per node shared by a group (default: one core per task)')
+    orch_parser.add_argument('--resume', action='store_true',
+                             help='Skip completed, running and pending calculations; resubmit only the rest')
+    orch_parser.add_argument('--no-dedup', dest='dedup', action='store_false',
+                             help='Calculate duplicate structures separately')
+    orch_parser.add_argument('--dedup-tol', type=float, default=0.05,
+                             help='RMSD (Angstrom) below which structures with equal charge are duplicates')
+    orch_parser.add_argument('--executor', choices=['slurm', 'local'], default='slurm',
+                             help='Submit to Slurm or run ORCA on this machine')
+    orch_parser.add_argument('--local-workers', type=int, default=None,
+                             help='Concurrent ORCA processes for --executor local (default: CPU count)')
+    orch_parser.add_argument('--array', action='store_true',
+                             help='Submit all calculations as one Slurm job array instead of node groups')
+    orch_parser.add_argument('--array-limit', type=int, default=None,
+                             help='Maximum number of array tasks running at once')
+    orch_parser.add_argument('--array-max', type=int, default=1001,
+                             help="Largest job array (the cluster's MaxArraySize); more calculations are split into several arrays")
 
     # Equilibration command
     eq_parser = subparsers.add_parser('equilibrate', help='Save equilibrated (last-frame) XYZ molecules')
@@ -89,6 +202,8 @@ def main():
                            help='Directory with calculations (contains basis set directories)')
     eq_parser.add_argument('-o', '--output', default='equilibrated',
                            help='Output directory for equilibrated molecules')
+    eq_parser.add_argument('--rescan', action='store_true',
+                           help='Rebuild the calculation manifest by scanning the directory tree')
 
     # Interactive visualization command
     inter_parser = subparsers.add_parser('interactive', help='Build interactive HTML visualization')
@@ -102,65 +217,87 @@ def main():
                               help='Dict or path to CSV with Method;Slope;Intercept')
     inter_parser.add_argument('--html_name', default=None,
                               help='Name of output HTML file (default auto)')
+    inter_parser.add_argument('--format', dest='table_format', choices=['csv', 'parquet', 'feather'], default='csv',
+                              help='Format of the pka table (parquet/feather need pyarrow)')
+    inter_parser.add_argument('--plotlyjs', default='cdn',
+                              help="'cdn', 'inline' (embed plotly.js of the plotly package) or path to a plotly.js file to embed")
 
     # Extract minimal pKa
     minpka_parser = subparsers.add_parser("minpka", help="Extract minimal pKa per Base_Molecule and save to CSV")
     minpka_parser.add_argument("analysis_dir", help="Directory with analysis results (contains pka_all.csv)")
     minpka_parser.add_argument("-o", "--output", default=".", help="Output directory for CSV")
     minpka_parser.add_argument("-n", "--name_file", default="min", help="Name of output file")
+    minpka_parser.add_argument("--format", dest="table_format", choices=["csv", "parquet", "feather"],
+                               default="csv", help="Format of the pka tables (parquet/feather need pyarrow)")
+    minpka_parser.add_argument("-k", "--top-k", type=int, default=1,
+                               help="Keep the k lowest-pKa forms per molecule with their Rank")
 
 
 
     args = parser.parse_args()
 
+    # each command imports only its own modules: pandas, matplotlib and plotly
+    # take seconds to load and are not needed for calculate or monitor
     if args.command == 'calculate':
-        calculate_pka(args.xyz_dir, args.basis, args.methods, args.output, args.forms)
+        from .calculator import calculate_pka
+        calculate_pka(args.xyz_dir, args.basis, args.methods, args.output, args.forms,
+                      tasks_per_node=args.tasks_per_node, array=args.array,
+                      array_limit=args.array_limit, grouping=args.grouping,
+                      cores_per_node=args.cores_per_node, resume=args.resume,
+                      executor=args.executor, local_workers=args.local_workers,
+                      dedup=args.dedup, dedup_tolerance=args.dedup_tol, array_max=args.array_max)
     elif args.command == 'deprotonate':
-        process_deprotonation(args.calc_dir, args.output)
+        from .deprotonator import process_deprotonation
+        process_deprotonation(args.calc_dir, args.output, args.basis, args.method,
+                              args.all, args.workers, args.top_k, args.rescan)
     elif args.command == 'monitor':
-        monitor_jobs(args.summary_path, args.user)
+        from .monitor import monitor_jobs
+        monitor_jobs(args.summary_path, args.user, args.watch, args.json)
     elif args.command == 'process':
-        process_results(args.calc_dir, args.output, args.name_file)
+        from .processor import process_results
+        process_results(args.calc_dir, args.output, args.name_file, args.workers, args.pool,
+                        args.use_cache, args.rebuild_cache, args.table_format,
+                        rescan=args.rescan)
     elif args.command == 'analyze':
-        analyze_results(args.results_dir, args.experimental, args.output, args.name_file)
+        from .analyzer import analyze_results
+        analyze_results(args.results_dir, args.experimental, args.output, args.name_file,
+                        args.table_format)
     elif args.command == 'visualize':
-        visualize_results(args.analysis_dir, args.output, args.name_file, args.calibration_file)
+        from .visualizer import visualize_results
+        visualize_results(args.analysis_dir, args.output, args.name_file, args.calibration_file,
+                          args.table_format, workers=args.workers)
     elif args.command == 'pipeline':
-        print("\n=== Processing calculation results ===")
-        process_results(args.calc_dir, args.output, args.name_file)
-        
-        print("\n=== Analyzing results ===")
-        analyze_results(args.output, args.experimental, args.output, args.name_file)
-        
-        # print("\n=== Generating visualizations ===")
-        # visualize_results(args.output, args.output, args.name_file)
-    
-        print("\n=== Extracting minimal pKa values ===")
-        extract_min_pka(args.output, args.output, args.name_file)
-    
-        print("\n=== Generating visualization for minimal pKa ===")
-        visualize_results(args.output, args.output, args.name_file)
-    
-        print("\n=== Building interactive HTML visualization ===")
-        make_interactive_html(
-            name_file=args.name_file,
-            analysis_dir=args.output,
-            output_dir=args.output,
-            manual_coeffs=None,
-            html_name=f"pka_{args.name_file}_interactive.html"
-        )
-    
-        print("\nPipeline completed successfully!")
+        from .pipeline import run_pipeline
+        run_pipeline(args.calc_dir, args.experimental, args.output, args.name_file,
+                     args.workers, args.pool, args.use_cache, args.rebuild_cache,
+                     args.table_format, args.save_tables, args.top_k, args.plotlyjs,
+                     args.rescan)
+    elif args.command == 'orchestrate':
+        from .orchestrator import orchestrate
+        orchestrate(args.xyz_dir, args.basis, args.methods, args.output, args.results,
+                    args.name_file, args.user, experimental_file=args.experimental,
+                    poll_interval=args.poll, workers=args.workers,
+                    tasks_per_node=args.tasks_per_node, grouping=args.grouping,
+                    cores_per_node=args.cores_per_node, resume=args.resume,
+                    array=args.array, array_limit=args.array_limit, array_max=args.array_max,
+                    executor=args.executor, local_workers=args.local_workers,
+                    dedup=args.dedup, dedup_tolerance=args.dedup_tol)
     elif args.command == 'equilibrate':
-        process_equilibrated(args.calc_dir, args.output)
+        from .equilibrator import process_equilibrated
+        process_equilibrated(args.calc_dir, args.output, args.rescan)
     elif args.command == 'interactive':
+        from .interactive import make_interactive_html
         make_interactive_html(name_file=args.name_file,
                               analysis_dir=args.analysis_dir,
                               output_dir=args.output,
                               # manual_coeffs=args.manual_coeffs,
-                              html_name=args.html_name)
+                              html_name=args.html_name,
+                              table_format=args.table_format,
+                              plotlyjs=args.plotlyjs)
     elif args.command == "minpka":
-        extract_min_pka(args.analysis_dir, args.output, args.name_file)
+        from .min_pka import extract_min_pka
+        extract_min_pka(args.analysis_dir, args.output, args.name_file, args.table_format,
+                        top_k=args.top_k)
 
 
 if __name__ == '__main__':
@@ -1,60 +1,145 @@
 import os
 import re
-import random
 import csv
+import mmap
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+import numpy as np
+from .trajectory import get_last_frame_from_trj
+from .manifest import load_manifest
 
-def find_charged_hydrogen(output_content):
-    """Find the hydrogen with highest charge in Mulliken analysis"""
-    sections = re.findall(
-        r'-+\nMULLIKEN ATOMIC CHARGES\n-+\n(.*?)\nSum of atomic charges:.*?\n',
-        output_content,
-        re.DOTALL
-    )
-    
-    if not sections:
-        return None
-    
-    last_section = sections[-1]
+MULLIKEN_HEADER = b'\nMULLIKEN ATOMIC CHARGES\n'
+MULLIKEN_END = b'\nSum of atomic charges'
+
+# Covalent radii (Angstrom) used to detect bonds from the distance matrix
+COVALENT_RADII = {
+    'H': 0.31, 'C': 0.76, 'O': 0.66, 'N': 0.71,
+    'B': 0.84, 'Br': 1.20, 'Si': 1.11, 'Cl': 1.02,
+    'F': 0.57, 'Li': 1.28, 'S': 1.05,
+}
+DEFAULT_COVALENT_RADIUS = 0.8
+BOND_TOLERANCE = 1.2
+FINGERPRINT_ROUNDS = 4
+
+def parse_mulliken_hydrogens(section):
+    """Return [(atom_id, charge), ...] of hydrogens in a Mulliken charges section"""
     hydrogens = []
     
-    for line in last_section.split('\n'):
+    for line in section.split('\n'):
         if ' H :' in line:
             parts = line.split()
             atom_id = int(parts[0])
             charge = float(parts[3])
             hydrogens.append((atom_id, charge))
-    
+
+    return hydrogens
+
+def most_charged_hydrogen(hydrogens):
+    """Atom id of the hydrogen with highest charge; the lowest id wins ties, so the choice is reproducible"""
     if not hydrogens:
         return None
     
-    max_charge = max(h[1] for h in hydrogens)
-    candidates = [h[0] for h in hydrogens if h[1] == max_charge]
-    return random.choice(candidates)
+    return min(hydrogens, key=lambda h: (-h[1], h[0]))[0]
 
-def get_last_frame_from_trj(trj_file_path):
-    """Extract the last frame from input_trj.xyz file"""
-    with open(trj_file_path, 'r') as f:
-        content = f.read()
-    
-    frames = re.findall(r'(\d+\n.*?)(?=\n\d+\n|\Z)', content, re.DOTALL)
-    
-    if not frames:
-        raise ValueError("No frames found in input_trj.xyz")
-    
-    last_frame = frames[-1].strip()
-    lines = last_frame.split('\n')
+def select_charged_hydrogen(section):
+    """Pick the hydrogen with highest charge from the lines of a Mulliken charges section"""
+    return most_charged_hydrogen(parse_mulliken_hydrogens(section))
+
+def atom_fingerprints(atoms):
+    """
+    Topological class of every atom of a frame.
+
+    Bonds come from the interatomic distance matrix; labels are then refined
+    from neighbour labels, so symmetry-equivalent atoms (e.g. the three methyl
+    hydrogens) get the same class.
+    """
+    elements = [atom[0] for atom in atoms]
+    coords = np.array([[float(c) for c in atom[1:4]] for atom in atoms])
+    radii = np.array([COVALENT_RADII.get(e, DEFAULT_COVALENT_RADIUS) for e in elements])
+
+    distances = np.linalg.norm(coords[:, None, :] - coords[None, :, :], axis=-1)
+    bonded = distances < BOND_TOLERANCE * (radii[:, None] + radii[None, :])
+    np.fill_diagonal(bonded, False)
+
+    _, labels = np.unique(elements, return_inverse=True)
+    for _ in range(FINGERPRINT_ROUNDS):
+        # new label = (own label, sorted neighbour labels), renumbered
+        signatures = [(labels[i], tuple(sorted(labels[bonded[i]]))) for i in range(len(atoms))]
+        index = {sig: n for n, sig in enumerate(sorted(set(signatures)))}
+        labels = np.array([index[sig] for sig in signatures])
+
+    return labels
+
+def rank_acidic_sites(hydrogens, atoms, top_k):
+    """
+    Atom ids of up to top_k most positive hydrogens, keeping one hydrogen per
+    group of symmetry-equivalent ones.
+    """
+    fingerprints = atom_fingerprints(atoms)
+    sites = []
+    seen = set()
+    for atom_id, charge in sorted(hydrogens, key=lambda h: (-h[1], h[0])):
+        if atom_id >= len(atoms):
+            continue
+        fingerprint = fingerprints[atom_id]
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        sites.append(atom_id)
+        if len(sites) == top_k:
+            break
+    return sites
+
+def find_charged_hydrogen(output_content):
+    """Find the hydrogen with highest charge in Mulliken analysis"""
+    sections = re.findall(
+        r'-+\nMULLIKEN ATOMIC CHARGES\n-+\n(.*?)\nSum of atomic charges:.*?\n',
+        output_content,
+        re.DOTALL
+    )
     
-    num_atoms = int(lines[0])
-    comment = lines[1]
-    atoms = [line.strip().split() for line in lines[2:2+num_atoms]]
+    if not sections:
+        return None
     
-    return num_atoms, comment, atoms
+    return select_charged_hydrogen(sections[-1])
+
+def read_last_mulliken_section(output_file):
+    """
+    Return the lines of the last complete MULLIKEN ATOMIC CHARGES block, searching backwards
+    from EOF. A block still being written (no sum line yet) is skipped for the one before it.
+    """
+    with open(output_file, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+        with mm:
+            header = mm.rfind(MULLIKEN_HEADER)
+            while header != -1:
+                # skip the dashes line under the header
+                start = mm.find(b'\n', header + len(MULLIKEN_HEADER)) + 1
+                end = mm.find(MULLIKEN_END, start) if start else -1
+                if end != -1:
+                    return mm[start:end].decode(errors='replace')
+                header = mm.rfind(MULLIKEN_HEADER, 0, header)
+            return None
 
-def create_deprotonated_xyz(trj_xyz_path, output_dir, hydrogen_id, molecule):
-    """Create deprotonated XYZ file by removing specified hydrogen from last frame"""
-    num_atoms, comment, atoms = get_last_frame_from_trj(trj_xyz_path)
+def find_charged_hydrogens_in_file(output_file):
+    """Hydrogens [(atom_id, charge), ...] of the last Mulliken analysis of output_file"""
+    section = read_last_mulliken_section(output_file)
+    if section is None:
+        return []
+    return parse_mulliken_hydrogens(section)
+
+def create_deprotonated_xyz(trj_xyz_path, output_dir, hydrogen_id, molecule, site=None, frame=None):
+    """
+    Create deprotonated XYZ file by removing specified hydrogen from last frame.
+
+    With site the file is named <molecule>_<site>_deprotonated.xyz.
+    """
+    num_atoms, comment, atoms = frame if frame is not None else get_last_frame_from_trj(trj_xyz_path)
     
     hydrogen_info = atoms[hydrogen_id] if hydrogen_id < len(atoms) else None
     
@@ -63,132 +148,198 @@ def create_deprotonated_xyz(trj_xyz_path, output_dir, hydrogen_id, molecule):
     new_content = f"{len(new_atoms)}\n{comment}\n"
     new_content += "\n".join(" ".join(atom) for atom in new_atoms)
     
-    output_path = output_dir / f"{molecule}_deprotonated.xyz"
+    name = f"{molecule}_{site}" if site else molecule
+    output_path = output_dir / f"{name}_deprotonated.xyz"
     with open(output_path, 'w') as f:
         f.write(new_content)
     
     return output_path, hydrogen_info
 
-def write_removal_info_to_csv(csv_path, molecule, basis_set, method, hydrogen_id, hydrogen_info, timestamp):
-    """Write information about removed hydrogen to CSV file"""
+REMOVAL_FIELDS = ['timestamp', 'molecule', 'basis_set', 'method', 'hydrogen_id',
+                  'element', 'x_coord', 'y_coord', 'z_coord']
+
+def removal_record(molecule, basis_set, method, hydrogen_id, hydrogen_info, timestamp):
+    """Row of removed_hydrogens.csv"""
+    if hydrogen_info and len(hydrogen_info) >= 4:
+        element, x, y, z = hydrogen_info[:4]
+    else:
+        element, x, y, z = 'Unknown', 'N/A', 'N/A', 'N/A'
+    return {
+        'timestamp': timestamp,
+        'molecule': molecule,
+        'basis_set': basis_set,
+        'method': method,
+        'hydrogen_id': hydrogen_id,
+        'element': element,
+        'x_coord': x,
+        'y_coord': y,
+        'z_coord': z
+    }
+
+def write_removal_info_to_csv(csv_path, records):
+    """Append information about removed hydrogens to CSV file in one write"""
+    if not records:
+        return
     file_exists = csv_path.exists()
     
     with open(csv_path, 'a', newline='') as csvfile:
-        fieldnames = ['timestamp', 'molecule', 'basis_set', 'method', 'hydrogen_id', 
-                     'element', 'x_coord', 'y_coord', 'z_coord']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=REMOVAL_FIELDS)
         
         if not file_exists:
             writer.writeheader()
-        
-        if hydrogen_info and len(hydrogen_info) >= 4:
-            writer.writerow({
-                'timestamp': timestamp,
-                'molecule': molecule,
-                'basis_set': basis_set,
-                'method': method,
-                'hydrogen_id': hydrogen_id,
-                'element': hydrogen_info[0],
-                'x_coord': hydrogen_info[1],
-                'y_coord': hydrogen_info[2],
-                'z_coord': hydrogen_info[3]
-            })
+        writer.writerows(records)
+
+def find_basis_sets(entries):
+    return sorted({key[0] for key in entries})
+
+def find_neutral_methods(entries, basis):
+    """Return (molecules, methods) with neutral calculations of basis in the manifest entries"""
+    methods = set()
+    molecules = set()
+    
+    for b, molecule, form, method in entries:
+        if b == basis:
+            molecules.add(molecule)
+            if form == "neutral":
+                methods.add(method)
+
+    return sorted(molecules), sorted(methods)
+
+def choose(options, prompt):
+    """Ask the user to pick one of options by number"""
+    for i, option in enumerate(options, 1):
+        print(f"{i}. {option}")
+    
+    choice = input(f"\nSelect {prompt} (number): ")
+    try:
+        return options[int(choice)-1]
+    except (ValueError, IndexError):
+        print("Invalid selection")
+        return None
+
+def deprotonate_molecule(basis_path, molecule, basis, method, output_dir, top_k=1):
+    """
+    Create deprotonated structures of one molecule. Returns (removal records, messages).
+
+    With top_k > 1 up to top_k non-equivalent sites are removed, one file
+    <molecule>_H<atom id>_deprotonated.xyz per site.
+    """
+    output_path = basis_path / molecule / "neutral" / method / "output.out"
+    trj_path = basis_path / molecule / "neutral" / method / "input_trj.xyz"
+    
+    if not output_path.exists():
+        return [], [f"Skipping {molecule}: output.out not found"]
+    if not trj_path.exists():
+        return [], [f"Skipping {molecule}: input_trj.xyz not found"]
+    
+    hydrogens = find_charged_hydrogens_in_file(output_path)
+    if not hydrogens:
+        return [], [f"No charged hydrogen found in {molecule}"]
+
+    records = []
+    messages = []
+    try:
+        frame = get_last_frame_from_trj(trj_path)
+        if top_k and top_k > 1:
+            sites = [(atom_id, f"H{atom_id}") for atom_id in rank_acidic_sites(hydrogens, frame[2], top_k)]
         else:
-            writer.writerow({
-                'timestamp': timestamp,
-                'molecule': molecule,
-                'basis_set': basis_set,
-                'method': method,
-                'hydrogen_id': hydrogen_id,
-                'element': 'Unknown',
-                'x_coord': 'N/A',
-                'y_coord': 'N/A',
-                'z_coord': 'N/A'
-            })
-
-def process_deprotonation(calc_dir, output_dir):
-    """Interactive process to create deprotonated XYZ files"""
+            sites = [(most_charged_hydrogen(hydrogens), None)]
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for hydrogen_id, site in sites:
+            xyz_path, hydrogen_info = create_deprotonated_xyz(trj_path, output_dir, hydrogen_id, molecule,
+                                                              site, frame)
+            records.append(removal_record(molecule, basis, method, hydrogen_id, hydrogen_info, timestamp))
+            messages.append(f"Processed {molecule} - removed hydrogen {hydrogen_id} "
+                            f"(coordinates: {hydrogen_info[1:] if hydrogen_info else 'N/A'})")
+    except Exception as e:
+        messages.append(f"Error processing {molecule}: {e}")
+    return records, messages
+
+def deprotonate_combination(calc_dir, basis, method, molecules, output_dir, workers=1, top_k=1):
+    """Deprotonate all molecules of one basis/method, in a process pool if workers > 1"""
+    basis_path = calc_dir / basis
+    output_dir.mkdir(parents=True, exist_ok=True)
+    args = [(basis_path, molecule, basis, method, output_dir, top_k) for molecule in molecules]
+
+    if workers and workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(deprotonate_molecule, *zip(*args)))
+    else:
+        results = [deprotonate_molecule(*a) for a in args]
+
+    records = []
+    for molecule_records, messages in results:
+        for message in messages:
+            print(message)
+        records.extend(molecule_records)
+    return records
+
+def process_deprotonation(calc_dir, output_dir, basis=None, method=None, all_combinations=False, workers=1,
+                          top_k=1, rescan=False):
+    """
+    Create deprotonated XYZ files from optimized neutral structures.
+
+    basis and method are asked interactively unless given; with all_combinations
+    every basis/method is processed, each into output_dir/<basis>/<method>.
+    With top_k > 1 the top_k most acidic non-equivalent sites of each molecule are used.
+    Calculations are listed from the manifest of calc_dir (rebuilt if rescan).
+    """
     calc_dir = Path(calc_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
     
     csv_path = output_dir / "removed_hydrogens.csv"
     
-    basis_sets = [d.name for d in calc_dir.iterdir() if d.is_dir()]
+    entries = load_manifest(calc_dir, rescan)
+    basis_sets = find_basis_sets(entries)
     if not basis_sets:
         print("No basis sets found in calculation directory")
         return
-    
-    print("\nAvailable basis sets:")
-    for i, basis in enumerate(basis_sets, 1):
-        print(f"{i}. {basis}")
-    
-    basis_choice = input("\nSelect basis set (number): ")
-    try:
-        selected_basis = basis_sets[int(basis_choice)-1]
-    except (ValueError, IndexError):
-        print("Invalid selection")
-        return
-    
-    basis_path = calc_dir / selected_basis
-    methods = set()
-    molecules = set()
-    
-    for mol_dir in basis_path.iterdir():
-        if mol_dir.is_dir():
-            molecules.add(mol_dir.name)
-            for form_dir in mol_dir.iterdir():
-                if form_dir.is_dir() and form_dir.name == "neutral":
-                    for method_dir in form_dir.iterdir():
-                        if method_dir.is_dir():
-                            methods.add(method_dir.name)
-    
-    if not methods:
-        print("No methods found for selected basis set")
-        return
-    
-    print("\nAvailable methods:")
-    for i, method in enumerate(sorted(methods), 1):
-        print(f"{i}. {method}")
-    
-    method_choice = input("\nSelect method (number): ")
-    try:
-        selected_method = sorted(methods)[int(method_choice)-1]
-    except (ValueError, IndexError):
-        print("Invalid selection")
+
+    if all_combinations:
+        combinations = []
+        for b in basis_sets:
+            molecules, methods = find_neutral_methods(entries, b)
+            combinations.extend((b, m, molecules, output_dir / b / m) for m in methods)
+    else:
+        if basis is None:
+            print("\nAvailable basis sets:")
+            basis = choose(basis_sets, "basis set")
+            if basis is None:
+                return
+        elif basis not in basis_sets:
+            print(f"Basis set {basis} not found in {calc_dir}")
+            return
+
+        molecules, methods = find_neutral_methods(entries, basis)
+        if not methods:
+            print("No methods found for selected basis set")
+            return
+
+        if method is None:
+            print("\nAvailable methods:")
+            method = choose(methods, "method")
+            if method is None:
+                return
+        elif method not in methods:
+            print(f"Method {method} not found for basis set {basis}")
+            return
+
+        combinations = [(basis, method, molecules, output_dir)]
+
+    if not combinations:
+        print("No methods found in calculation directory")
         return
-    
-    print(f"\nProcessing molecules with basis '{selected_basis}' and method '{selected_method}'...")
+
     print(f"Removal information will be saved to: {csv_path}")
+
+    records = []
+    for b, m, molecules, combo_output_dir in combinations:
+        print(f"\nProcessing molecules with basis '{b}' and method '{m}'...")
+        records.extend(deprotonate_combination(calc_dir, b, m, molecules, combo_output_dir, workers, top_k))
+
+    write_removal_info_to_csv(csv_path, records)
     
-    processed = 0
-    for molecule in sorted(molecules):
-        output_path = basis_path / molecule / "neutral" / selected_method / "output.out"
-        trj_path = basis_path / molecule / "neutral" / selected_method / "input_trj.xyz"
-        
-        if not output_path.exists():
-            print(f"Skipping {molecule}: output.out not found")
-            continue
-        if not trj_path.exists():
-            print(f"Skipping {molecule}: input_trj.xyz not found")
-            continue
-        
-        with open(output_path, 'r') as f:
-            content = f.read()
-        
-        hydrogen_id = find_charged_hydrogen(content)
-        if hydrogen_id is not None:
-            try:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                xyz_path, hydrogen_info = create_deprotonated_xyz(trj_path, output_dir, hydrogen_id, molecule)
-                write_removal_info_to_csv(csv_path, molecule, selected_basis, selected_method, 
-                                         hydrogen_id, hydrogen_info, timestamp)
-                processed += 1
-                print(f"Processed {molecule} - removed hydrogen {hydrogen_id} (coordinates: {hydrogen_info[1:] if hydrogen_info else 'N/A'})")
-            except Exception as e:
-                print(f"Error processing {molecule}: {e}")
-        else:
-            print(f"No charged hydrogen found in {molecule}")
-    
-    print(f"\nDone! Created {processed} deprotonated molecules in {output_dir}")
-    print(f"Removal information saved to: {csv_path}")
\ No newline at end of file
+    print(f"\nDone! Created {len(records)} deprotonated structures in {output_dir}")
+    print(f"Removal information saved to: {csv_path}")
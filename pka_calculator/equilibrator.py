@@ -1,27 +1,8 @@
-import re
 import csv
 from pathlib import Path
 from datetime import datetime
-
-
-def get_last_frame_from_trj(trj_file_path):
-    """Extract the last frame from input_trj.xyz file"""
-    with open(trj_file_path, 'r') as f:
-        content = f.read()
-
-    frames = re.findall(r'(\d+\n.*?)(?=\n\d+\n|\Z)', content, re.DOTALL)
-
-    if not frames:
-        raise ValueError("No frames found in input_trj.xyz")
-
-    last_frame = frames[-1].strip()
-    lines = last_frame.split('\n')
-
-    num_atoms = int(lines[0])
-    comment = lines[1]
-    atoms = [line.strip().split() for line in lines[2:2 + num_atoms]]
-
-    return num_atoms, comment, atoms
+from .trajectory import get_last_frame_from_trj
+from .manifest import load_manifest, calculation_dir
 
 
 def create_equilibrated_xyz(trj_xyz_path, output_dir, molecule):
@@ -58,15 +39,19 @@ def write_equilibrated_info_to_csv(csv_path, molecule, basis_set, method, timest
         })
 
 
-def process_equilibrated(calc_dir, output_dir):
-    """Process and save equilibrated XYZ molecules"""
+def process_equilibrated(calc_dir, output_dir, rescan=False):
+    """
+    Process and save equilibrated XYZ molecules.
+    Calculations are listed from the manifest of calc_dir (rebuilt if rescan).
+    """
     calc_dir = Path(calc_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
     csv_path = output_dir / "equilibrated_molecules.csv"
 
-    basis_sets = [d.name for d in calc_dir.iterdir() if d.is_dir()]
+    entries = load_manifest(calc_dir, rescan)
+    basis_sets = sorted({key[0] for key in entries})
     if not basis_sets:
         print("No basis sets found in calculation directory")
         return
@@ -82,32 +67,19 @@ def process_equilibrated(calc_dir, output_dir):
         print("Invalid selection")
         return
 
-    basis_path = calc_dir / selected_basis
-    methods = set()
-    molecules = set()
-
-    for mol_dir in basis_path.iterdir():
-        if mol_dir.is_dir():
-            molecules.add(mol_dir.name)
-            forms = set()
-            for form_dir in mol_dir.iterdir():
-                if form_dir.is_dir():
-                    forms.add(form_dir.name)
-                    for method_dir in form_dir.iterdir():
-                        if method_dir.is_dir():
-                            methods.add(method_dir.name)
+    methods = sorted({key[3] for key in entries if key[0] == selected_basis})
 
     if not methods:
         print("No methods found for selected basis set")
         return
 
     print("\nAvailable methods:")
-    for i, method in enumerate(sorted(methods), 1):
+    for i, method in enumerate(methods, 1):
         print(f"{i}. {method}")
 
     method_choice = input("\nSelect method (number): ")
     try:
-        selected_method = sorted(methods)[int(method_choice) - 1]
+        selected_method = methods[int(method_choice) - 1]
     except (ValueError, IndexError):
         print("Invalid selection")
         return
@@ -116,35 +88,31 @@ def process_equilibrated(calc_dir, output_dir):
     print(f"Information will be saved to: {csv_path}")
 
     processed = 0
-    for molecule in sorted(molecules):
-        mol_dir = basis_path / molecule
-        for form_dir in mol_dir.iterdir():
-            if not form_dir.is_dir():
-                continue
-            for method_dir in form_dir.iterdir():
-                if not method_dir.is_dir():
-                    continue
-    
-                trj_path = method_dir / "input_trj.xyz"
-                if not trj_path.exists():
-                    print(f"Skipping {molecule}/{form_dir.name}/{method_dir.name}: input_trj.xyz not found")
-                    continue
-    
-                try:
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    xyz_path, num_atoms = create_equilibrated_xyz(trj_path, output_dir, f"{molecule}{'' if form_dir.name == 'neutral' else '_' + form_dir.name}")
-                    write_equilibrated_info_to_csv(
-                        csv_path,
-                        f"{molecule}_{form_dir.name}",
-                        selected_basis,
-                        method_dir.name,
-                        timestamp,
-                        num_atoms
-                    )
-                    processed += 1
-                    print(f"Processed {molecule}/{form_dir.name} - saved equilibrated structure ({num_atoms} atoms)")
-                except Exception as e:
-                    print(f"Error processing {molecule}/{form_dir.name}: {e}")
+    for key in sorted(entries):
+        _, molecule, form, method = key
+        if key[0] != selected_basis or method != selected_method:
+            continue
+
+        trj_path = calculation_dir(calc_dir, key) / "input_trj.xyz"
+        if not trj_path.exists():
+            print(f"Skipping {molecule}/{form}/{method}: input_trj.xyz not found")
+            continue
+
+        try:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            xyz_path, num_atoms = create_equilibrated_xyz(trj_path, output_dir, f"{molecule}{'' if form == 'neutral' else '_' + form}")
+            write_equilibrated_info_to_csv(
+                csv_path,
+                f"{molecule}_{form}",
+                selected_basis,
+                method,
+                timestamp,
+                num_atoms
+            )
+            processed += 1
+            print(f"Processed {molecule}/{form} - saved equilibrated structure ({num_atoms} atoms)")
+        except Exception as e:
+            print(f"Error processing {molecule}/{form}: {e}")
 
     print(f"\nDone! Created {processed} equilibrated molecules in {output_dir}")
     print(f"Information saved to: {csv_path}")
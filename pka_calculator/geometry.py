@@ -0,0 +1,163 @@
+import csv
+from pathlib import Path
+import numpy as np
+
+ALIASES_FILE = "calculation_aliases.csv"
+ALIAS_FIELDS = ["Basis", "Molecule", "Form", "Alias_Of_Molecule", "Alias_Of_Form"]
+
+
+def read_xyz_geometry(xyz_file):
+    """Return (elements, coordinates array) of an xyz file"""
+    with open(xyz_file, 'r') as f:
+        lines = f.readlines()
+
+    elements = []
+    coords = []
+    for line in lines[2:]:
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        elements.append(parts[0])
+        coords.append([float(c) for c in parts[1:4]])
+    return elements, np.array(coords, dtype=float).reshape(-1, 3)
+
+
+def canonical_geometry(elements, coords):
+    """
+    Put atoms in element order (then by distance from centroid) and center the coordinates.
+    Atoms of the same element are matched again before comparing structures, see match_atoms.
+    """
+    elements = np.array(elements)
+    centered = coords - coords.mean(axis=0)
+    radius = np.linalg.norm(centered, axis=1)
+    order = np.lexsort((radius, elements))
+    return tuple(elements[order]), centered[order]
+
+
+def distance_profiles(coords):
+    """Sorted distances of every atom to all atoms: a rotation-invariant label of the atom"""
+    return np.sort(np.linalg.norm(coords[:, None] - coords[None], axis=-1), axis=1)
+
+
+def kabsch_align(reference, structure):
+    """structure (n, 3) rotated onto reference (n, 3), both centered; reflections are not allowed"""
+    u, _, vt = np.linalg.svd(structure.T @ reference)
+    d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    return structure @ (u @ np.diag([1.0, 1.0, d]) @ vt)
+
+
+def assign_atoms(element_blocks, cost):
+    """Order of structure atoms matching reference atoms, by optimal assignment within each element"""
+    from scipy.optimize import linear_sum_assignment  # not at module level: slow import for calculate
+
+    order = np.arange(cost.shape[0])
+    for idx in element_blocks:
+        rows, cols = linear_sum_assignment(cost[np.ix_(idx, idx)])
+        order[idx[cols]] = idx[rows]
+    return order
+
+
+def match_atoms(elements, reference, structure, reference_profiles=None, profiles=None, refine_steps=2):
+    """
+    Reorder the atoms of structure to correspond to those of reference (same element order).
+    Atoms are first paired by distance profiles, then re-paired by distance after Kabsch alignment,
+    so same-element atoms at nearly equal radii are matched however noise ordered them.
+    """
+    elements = np.asarray(elements)
+    blocks = [np.flatnonzero(elements == e) for e in np.unique(elements)]
+    if reference_profiles is None:
+        reference_profiles = distance_profiles(reference)
+    if profiles is None:
+        profiles = distance_profiles(structure)
+
+    cost = np.abs(profiles[:, None, :] - reference_profiles[None, :, :]).sum(-1)
+    structure = structure[assign_atoms(blocks, cost)]
+    for _ in range(refine_steps):
+        aligned = kabsch_align(reference, structure)
+        cost = np.linalg.norm(aligned[:, None] - reference[None], axis=-1)
+        structure = structure[assign_atoms(blocks, cost)]
+    return structure
+
+
+def kabsch_rmsd(reference, structures):
+    """RMSD of every structure (m, n, 3) to reference (n, 3) after optimal rotation"""
+    covariance = np.einsum('mni,nj->mij', structures, reference)
+    u, s, vt = np.linalg.svd(covariance)
+    # reflections are not allowed: flip the smallest singular value if needed
+    sign = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    s[:, -1] *= sign
+    n_atoms = reference.shape[0]
+    msd = ((structures ** 2).sum(axis=(1, 2)) + (reference ** 2).sum() - 2 * s.sum(axis=1)) / n_atoms
+    return np.sqrt(np.clip(msd, 0, None))
+
+
+def find_duplicate_structures(structures, tolerance=0.05):
+    """
+    Map duplicate structures to the first equal one.
+
+    structures is a list of (key, xyz_file, charge); structures with the same
+    charge and composition whose Kabsch RMSD is below tolerance (Angstrom),
+    after matching atoms of each element, are duplicates.
+    Returns {duplicate key: representative key}.
+    """
+    groups = {}
+    for key, xyz_file, charge in structures:
+        elements, coords = canonical_geometry(*read_xyz_geometry(xyz_file))
+        groups.setdefault((charge, elements), []).append((key, coords))
+
+    aliases = {}
+    for (_, elements), members in groups.items():
+        rep_keys = []
+        rep_coords = []
+        rep_profiles = []
+        for key, coords in members:
+            profiles = distance_profiles(coords)
+            if rep_coords:
+                rmsd = np.array([
+                    kabsch_rmsd(ref, match_atoms(elements, ref, coords, ref_profiles, profiles)[None])[0]
+                    for ref, ref_profiles in zip(rep_coords, rep_profiles)
+                ])
+                best = int(np.argmin(rmsd))
+                if rmsd[best] < tolerance:
+                    aliases[key] = rep_keys[best]
+                    continue
+            rep_keys.append(key)
+            rep_coords.append(coords)
+            rep_profiles.append(profiles)
+    return aliases
+
+
+def load_aliases(calc_dir):
+    """Return {(basis, molecule, form): (molecule, form)} from the aliases file of calc_dir"""
+    path = Path(calc_dir) / ALIASES_FILE
+    if not path.exists():
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {
+            (row["Basis"], row["Molecule"], row["Form"]): (row["Alias_Of_Molecule"], row["Alias_Of_Form"])
+            for row in csv.DictReader(f, delimiter=';')
+        }
+
+
+def write_aliases(calc_dir, basis, aliases, checked):
+    """
+    Update the aliases file of calc_dir with {(molecule, form): (molecule, form)} for basis.
+    Earlier entries of the checked (molecule, form) pairs are replaced.
+    """
+    all_aliases = {
+        key: value for key, value in load_aliases(calc_dir).items()
+        if not (key[0] == basis and key[1:] in checked)
+    }
+    for (molecule, form), target in aliases.items():
+        all_aliases[(basis, molecule, form)] = target
+
+    path = Path(calc_dir) / ALIASES_FILE
+    if not all_aliases:
+        if path.exists():
+            path.unlink()
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(ALIAS_FIELDS)
+        for (b, molecule, form), (alias_molecule, alias_form) in sorted(all_aliases.items()):
+            writer.writerow([b, molecule, form, alias_molecule, alias_form])
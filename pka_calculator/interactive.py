@@ -1,10 +1,41 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import linregress
 from pathlib import Path
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from .storage import read_table
+from .manifest import read_manifest, scan_tree
+from .calibration import fit_calibrations, replace_lines
 import re
+import json
+
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-latest.min.js"
+PAYLOAD_DECIMALS = 4
+
+# Restyles the fixed traces of the forms viewer (methods..., experimental, min pKa)
+FORMS_VIEWER_JS = """
+(function () {
+  const data = JSON.parse(document.getElementById('forms-data').textContent);
+  const slider = document.getElementById('molecule');
+  const label = document.getElementById('molecule-name');
+  function show(i) {
+    if (!data.molecules.length) return;
+    const forms = data.forms[i];
+    const x = [], y = [];
+    data.methods.forEach(function (method) { x.push(forms); y.push(data.values[method][i]); });
+    const exp = data.exp[i];
+    x.push(exp === null ? [] : [forms[0], forms[forms.length - 1]]);
+    y.push(exp === null ? [] : [exp, exp]);
+    x.push(data.min_form[i] === null ? [] : [data.min_form[i]]);
+    y.push(data.min_value[i] === null ? [] : [data.min_value[i]]);
+    Plotly.restyle('fig2', {x: x, y: y});
+    Plotly.relayout('fig2', {'title.text': 'pKa forms for ' + data.molecules[i]});
+    label.textContent = data.molecules[i];
+  }
+  slider.addEventListener('input', function () { show(Number(slider.value)); });
+  show(0);
+})();
+"""
 
 def natural_sort_key(s):
     return [int(text) if text.isdigit() else text.lower()
@@ -26,23 +57,11 @@ def read_manual_coeffs(manual_coeffs):
 def choose_basis_method(calc_dir: Path):
     calc_dir = Path(calc_dir)
 
-    combos = []
-    for basis_dir in calc_dir.iterdir():
-        if not basis_dir.is_dir():
-            continue
-        basis = basis_dir.name
-        for mol_dir in basis_dir.iterdir():
-            if not mol_dir.is_dir():
-                continue
-            for form_dir in mol_dir.iterdir():
-                if not form_dir.is_dir():
-                    continue
-                for method_dir in form_dir.iterdir():
-                    if not method_dir.is_dir():
-                        continue
-                    method = method_dir.name
-                    if (basis, method) not in combos:
-                        combos.append((basis, method))
+    # calc_dir may be an analysis directory: scan it if it has no manifest, but do not write one
+    entries = read_manifest(calc_dir)
+    if entries is None:
+        entries = scan_tree(calc_dir)
+    combos = sorted({(basis, method) for basis, _, _, method in entries})
 
     if not combos:
         print("No combinations available Basis/Method")
@@ -62,12 +81,67 @@ def choose_basis_method(calc_dir: Path):
         print("Invalid input")
         return None
 
+def json_values(values):
+    """Rounded floats with NaN as None, for the JSON payload"""
+    return [None if pd.isna(v) else round(float(v), PAYLOAD_DECIMALS) for v in values]
+
+def forms_payload(df, methods):
+    """Columnar data of the forms viewer: one list entry per molecule"""
+    molecules = sorted(df['Base_Molecule'].unique(), key=natural_sort_key)
+    payload = {"molecules": molecules, "methods": methods,
+               "forms": [], "values": {method: [] for method in methods},
+               "exp": [], "min_form": [], "min_value": []}
+    groups = df.groupby('Base_Molecule', sort=False)
+    for mol in molecules:
+        group = groups.get_group(mol)
+        payload["forms"].append(group['Molecule'].tolist())
+        for method in methods:
+            payload["values"][method].append(json_values(group[method]))
+        exp_vals = group['pKa (exp)'].dropna()
+        payload["exp"].append(json_values(exp_vals[:1])[0] if len(exp_vals) else None)
+        # lowest form of the last method, as marked by the star
+        values = group[methods[-1]]
+        if values.notna().any():
+            payload["min_form"].append(group.loc[values.idxmin(), 'Molecule'])
+            payload["min_value"].append(json_values([values.min()])[0])
+        else:
+            payload["min_form"].append(None)
+            payload["min_value"].append(None)
+    return payload
+
+def plotlyjs_tag(plotlyjs):
+    if plotlyjs == 'cdn':
+        return f'<script src="{PLOTLY_CDN}"></script>'
+    if plotlyjs == 'inline':
+        from plotly.offline import get_plotlyjs
+        return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    return f'<script type="text/javascript">{Path(plotlyjs).read_text(encoding="utf-8")}</script>'
+
+def calibration_text(fits):
+    """Lines 'method: a, b with 95% bootstrap CIs, MAE and leave-one-out MAE' of the fits table"""
+    lines = []
+    for fit in fits.itertuples(index=False):
+        lines.append(f"{fit.Column}: a = {fit.Slope:.4f} [{fit.Slope_CI_low:.4f}, {fit.Slope_CI_high:.4f}], "
+                     f"b = {fit.Intercept:.4f} [{fit.Intercept_CI_low:.4f}, {fit.Intercept_CI_high:.4f}], "
+                     f"MAE = {fit.MAE_calibrated:.3f} [{fit.MAE_CI_low:.3f}, {fit.MAE_CI_high:.3f}], "
+                     f"MAE LOO = {fit.MAE_LOO:.3f}")
+    return "\n".join(lines)
+
+
 def make_interactive_html(name_file,
                           analysis_dir,
                           output_dir='.',
                           manual_coeffs=None,
-                          html_name=None):
-    
+                          html_name=None,
+                          table_format='csv',
+                          pka_df=None,
+                          plotlyjs='cdn'):
+    """
+    Build the interactive HTML report from the pka table,
+    read from analysis_dir unless pka_df is given.
+    plotlyjs is 'cdn', 'inline' (plotly.js of the plotly package) or a path
+    to a plotly.js file to embed, so the page also works offline.
+    """
     analysis_dir = Path(analysis_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -82,11 +156,11 @@ def make_interactive_html(name_file,
         selected_basis = selected_method = None
 
     # === Step 2. Reading data ===
-    pka_file = analysis_dir / f"pka_{name_file}.csv"
-    if not pka_file.exists():
-        raise FileNotFoundError(f"pKa file not found: {pka_file}")
-
-    df = pd.read_csv(pka_file, sep=';')
+    columns = ['Molecule', 'Method', 'Basis', 'pKa (exp)', 'pKa_calc']
+    if pka_df is None:
+        df = read_table(analysis_dir, f"pka_{name_file}", table_format, columns=columns)
+    else:
+        df = pka_df[[c for c in columns if c in pka_df.columns]].copy()
     df['Molecule'] = df['Molecule'].astype(str)
     df['Base_Molecule'] = df['Molecule'].str.split('_').str[0]
 
@@ -99,37 +173,32 @@ def make_interactive_html(name_file,
     manual = read_manual_coeffs(manual_coeffs)
 
     # === Part A: Subplots per method ===
-    agg_rows = []
-    for base, group in df.groupby('Base_Molecule'):
-        exp_vals = group['pKa (exp)'].dropna()
-        exp_pka = exp_vals.iloc[0] if len(exp_vals) > 0 else np.nan
-        row = {'Base_Molecule': base, 'pKa (exp)': exp_pka}
-        for method in methods:
-            vals = group[method].dropna()
-            row[method] = vals.min() if len(vals) > 0 else np.nan
-        agg_rows.append(row)
-    agg_df = pd.DataFrame(agg_rows)
+    # first experimental value and lowest calculated value of every base molecule
+    grouped = df.groupby('Base_Molecule')
+    agg_df = pd.concat([grouped['pKa (exp)'].first(), grouped[methods].min()], axis=1).reset_index()
+
+    # all methods fitted in one batch; manual coefficients replace the fitted line
+    long_df = agg_df.melt(id_vars=['Base_Molecule', 'pKa (exp)'], value_vars=methods,
+                          var_name='Column', value_name='Value')
+    fits = fit_calibrations(long_df, ['Column'], y_column='Value')
+    fits = fits.set_index('Column').reindex(methods).rename_axis('Column').reset_index()
+    if manual:
+        lines = pd.DataFrame([(method, *manual[method]) for method in methods if method in manual],
+                             columns=['Column', 'Slope', 'Intercept'])
+        fits = replace_lines(long_df, fits, lines, ['Column'], y_column='Value')
 
     fig1 = make_subplots(rows=1, cols=len(methods),
                          subplot_titles=methods,
                          shared_yaxes=True)
-    calibration_params = {}
 
     for i, method in enumerate(methods):
         dfm = agg_df.dropna(subset=['pKa (exp)', method]).copy()
         x = dfm['pKa (exp)'].values
         y = dfm[method].values
 
-        if manual and method in manual:
-            slope, intercept = manual[method]
-        else:
-            if len(x) >= 2:
-                slope, intercept, _, _, _ = linregress(x, y)
-            else:
-                slope, intercept = np.nan, np.nan
-        calibration_params[method] = (slope, intercept)
-
-        r_squared = np.corrcoef(x, y)[0, 1]**2 if len(x) >= 2 else np.nan
+        fit = fits.iloc[i]
+        slope, intercept = fit['Slope'], fit['Intercept']
+        r_squared = fit['R2']
 
         fig1.add_trace(go.Scatter(x=x, y=y, mode='markers', name='Calculated',
                                   marker=dict(symbol='square', size=8),
@@ -158,53 +227,21 @@ def make_interactive_html(name_file,
                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
                        hovermode='closest')
 
-    # === Part B: Slider plot per molecule ===
-    molecules = sorted(df['Base_Molecule'].unique(), key=natural_sort_key)
-    traces = []
-    traces_per_mol = []
-
-    for mol in molecules:
-        group = df[df['Base_Molecule'] == mol].copy()
-        forms = group['Molecule'].tolist()
-        exp_vals = group['pKa (exp)'].dropna().unique()
-        exp_line = float(exp_vals[0]) if len(exp_vals) > 0 else None
-
-        for method in methods:
-            y = group[method].tolist()
-            trace = go.Scatter(x=forms, y=y, mode='markers+lines', name=method,
-                               hovertemplate='Form: %{x}<br>pKa: %{y:.2f}<extra></extra>',
-                               visible=(mol == molecules[0]))
-            traces.append(trace)
-
-        if exp_line is not None:
-            traces.append(go.Scatter(x=[forms[0], forms[-1]], y=[exp_line, exp_line],
-                                     mode='lines', line=dict(dash='dash', width=2, color='black'),
-                                     name='Experimental', visible=(mol == molecules[0])))
-        else:
-            traces.append(go.Scatter(x=[None], y=[None], visible=False))
+    # === Part B: Molecule forms viewer ===
+    # data of all molecules goes to the page as one columnar JSON payload;
+    # the figure has a fixed set of traces that a slider restyles
+    payload = forms_payload(df, methods)
 
-        min_val = group[method].min()
-        min_form = group.loc[group[method].idxmin(), 'Molecule']
-        traces.append(go.Scatter(x=[min_form], y=[min_val], mode='markers',
-                                 marker=dict(size=14, color='red', symbol='star'),
-                                 name='Min pKa', visible=(mol == molecules[0])))
-        traces_per_mol.append(len(methods) + 2)
+    traces = [go.Scatter(x=[], y=[], mode='markers+lines', name=method,
+                         hovertemplate='Form: %{x}<br>pKa: %{y:.2f}<extra></extra>')
+              for method in methods]
+    traces.append(go.Scatter(x=[], y=[], mode='lines',
+                             line=dict(dash='dash', width=2, color='black'), name='Experimental'))
+    traces.append(go.Scatter(x=[], y=[], mode='markers',
+                             marker=dict(size=14, color='red', symbol='star'), name='Min pKa'))
 
     fig2 = go.Figure(traces)
-    total_traces = len(traces)
-    steps = []
-    for idx, mol in enumerate(molecules):
-        vis = [False]*total_traces
-        offset = idx * traces_per_mol[0]
-        for j in range(traces_per_mol[0]):
-            vis[offset+j] = True
-        steps.append(dict(method="update", label=mol,
-                          args=[{"visible": vis}, {"title": f"pKa forms for {mol}"}]))
-
-    fig2.update_layout(sliders=[dict(active=0, pad={"t":50}, steps=steps,
-                                     currentvalue={"prefix": "Molecule: "})],
-                       title=f"pKa forms (molecule: {molecules[0]})",
-                       xaxis_title="Form", yaxis_title="pKa",
+    fig2.update_layout(xaxis_title="Form", yaxis_title="pKa",
                        height=600, width=1000,
                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
 
@@ -212,12 +249,14 @@ def make_interactive_html(name_file,
     html_path = output_dir / (html_name if html_name else f"pka_{name_file}_interactive.html")
     fig1_div = fig1.to_html(full_html=False, include_plotlyjs=False, div_id="fig1")
     fig2_div = fig2.to_html(full_html=False, include_plotlyjs=False, div_id="fig2")
+    n_molecules = len(payload["molecules"])
+    forms_json = json.dumps(payload, separators=(',', ':')).replace('</', '<\\/')
     page = f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
   <title>pKa: {name_file}</title>
-  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+  {plotlyjs_tag(plotlyjs)}
   <style> body {{ font-family: Arial, Helvetica, sans-serif; margin: 10px 20px; }} </style>
 </head>
 <body>
@@ -226,15 +265,18 @@ def make_interactive_html(name_file,
   {fig1_div}
   <hr/>
   <h2>2) Molecule forms viewer</h2>
+  <label>Molecule: <b id="molecule-name"></b></label><br/>
+  <input id="molecule" type="range" min="0" max="{max(n_molecules - 1, 0)}" value="0" style="width: 1000px" />
   {fig2_div}
+  <script type="application/json" id="forms-data">{forms_json}</script>
+  <script>{FORMS_VIEWER_JS}</script>
   <hr/>
   <h3>Calibration parameters (y = a * pKa_exp + b):</h3>
-  <pre>{calibration_params}</pre>
+  <pre>{calibration_text(fits)}</pre>
 </body>
 </html>
 """
     html_path.write_text(page, encoding='utf-8')
     print(f"\nInteractive HTML saved to: {html_path}")
-    print("Calibration parameters (method: (slope, intercept)):")
-    for m, (a, b) in calibration_params.items():
-        print(f"  {m}: a = {a:.4f}, b = {b:.4f}")
\ No newline at end of file
+    print("Calibration parameters (95% bootstrap CI):")
+    print(calibration_text(fits))
\ No newline at end of file
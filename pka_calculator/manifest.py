@@ -0,0 +1,97 @@
+import os
+import csv
+from pathlib import Path
+
+# Index of the calc_dir/basis/molecule/form/method tree, so later stages do
+# not have to list the (file-heavy) calculation directories again.
+MANIFEST_FILE = "calculation_manifest.csv"
+MANIFEST_FIELDS = ["Basis", "Molecule", "Form", "Method", "Status"]
+
+# Status of a calculation directory
+PENDING = "pending"        # no output.out yet
+OUTPUT = "output"          # output.out found by a scan, not parsed yet
+FINISHED = "finished"      # ORCA terminated normally
+INCOMPLETE = "incomplete"  # output.out without normal termination (running or failed)
+
+_unsaved = set()  # manifests that could not be written, reported once
+
+
+def _subdirs(path):
+    with os.scandir(path) as entries:
+        return [entry for entry in entries if entry.is_dir()]
+
+
+def scan_tree(calc_dir):
+    """
+    Walk exactly the four directory levels of calc_dir and return
+    {(basis, molecule, form, method): status}. Method directories are not listed.
+    """
+    entries = {}
+    for basis in _subdirs(calc_dir):
+        for molecule in _subdirs(basis.path):
+            for form in _subdirs(molecule.path):
+                for method in _subdirs(form.path):
+                    has_output = os.path.exists(os.path.join(method.path, "output.out"))
+                    entries[(basis.name, molecule.name, form.name, method.name)] = OUTPUT if has_output else PENDING
+    return entries
+
+
+def read_manifest(calc_dir):
+    """Return the stored manifest of calc_dir, or None if there is none"""
+    path = Path(calc_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, newline='', encoding='utf-8') as f:
+        return {
+            (row["Basis"], row["Molecule"], row["Form"], row["Method"]): row["Status"]
+            for row in csv.DictReader(f, delimiter=';')
+        }
+
+
+def write_manifest(calc_dir, entries):
+    """Save entries as the manifest of calc_dir; False (and a note) if calc_dir is not writable"""
+    path = Path(calc_dir) / MANIFEST_FILE
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(MANIFEST_FIELDS)
+            for key, status in sorted(entries.items()):
+                writer.writerow([*key, status])
+        # readers never see a half-written manifest
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if path not in _unsaved:
+            _unsaved.add(path)
+            print(f"Manifest not saved ({path}): {e}")
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def load_manifest(calc_dir, rescan=False):
+    """
+    Manifest of calc_dir; the tree is scanned (and the manifest saved, if calc_dir
+    is writable) if there is none or rescan
+    """
+    entries = None if rescan else read_manifest(calc_dir)
+    if entries is None:
+        entries = scan_tree(calc_dir)
+        write_manifest(calc_dir, entries)
+    return entries
+
+
+def update_manifest(calc_dir, statuses):
+    """Set {(basis, molecule, form, method): status} in the manifest of calc_dir"""
+    entries = load_manifest(calc_dir)
+    entries.update(statuses)
+    write_manifest(calc_dir, entries)
+    return entries
+
+
+def calculation_dir(calc_dir, key):
+    basis, molecule, form, method = key
+    return Path(calc_dir) / basis / molecule / form / method
@@ -1,38 +1,53 @@
-import pandas as pd
 from pathlib import Path
+from .storage import read_table, write_table
 
-def extract_min_pka(analysis_dir, output_dir, name_file):
-    analysis_dir = Path(analysis_dir)
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+PKA_COLUMNS = ["Base_Molecule", "Molecule", "Method", "Basis", "Calculation_Form",
+               "pKa (exp)", "pKa_calc"]
 
-    all_file = analysis_dir / f"pka_{name_file}.csv"
-    if not all_file.exists():
-        print(f"Error: {all_file} not found")
-        return
-
-    df_all = pd.read_csv(all_file, sep=";")
-
-    if "pKa_calc" not in df_all.columns:
-        print("Нет столбца 'pKa_calc' в файле")
-        return
+GROUP_COLUMNS = ["Base_Molecule", "Method", "Basis", "Calculation_Form"]
 
+def min_pka_table(df_all, top_k=1):
+    """
+    Lowest pKa_calc row per Base_Molecule, Method, Basis and Calculation_Form.
+    With top_k > 1 the top_k lowest rows are kept, numbered by a Rank column.
+    """
     if "Base_Molecule" not in df_all.columns:
-        df_all["Base_Molecule"] = df_all["Molecule"].astype(str).str.split("_").str[0]
+        df_all = df_all.assign(Base_Molecule=df_all["Molecule"].astype(str).str.split("_").str[0])
 
-    df_min = (
-        df_all.dropna(subset=["pKa_calc"])
-              .groupby(["Base_Molecule", "Method", "Basis", "Calculation_Form"], as_index=False)
-              .apply(lambda g: g.loc[g["pKa_calc"].idxmin()])
-              .reset_index(drop=True)
+    # stable sort: among equal pKa_calc the first row wins, as with idxmin
+    ranked = (
+        df_all.dropna(subset=GROUP_COLUMNS + ["pKa_calc"])
+              .sort_values(GROUP_COLUMNS + ["pKa_calc"], kind="mergesort")
     )
+    rank = ranked.groupby(GROUP_COLUMNS, sort=False).cumcount().to_numpy() + 1
+    keep = rank <= top_k
+
+    df_min = ranked.loc[keep, PKA_COLUMNS].reset_index(drop=True)
+    if top_k > 1:
+        df_min["Rank"] = rank[keep]
+    return df_min
+
+def extract_min_pka(analysis_dir, output_dir, name_file, table_format='csv', pka_df=None, save=True,
+                    top_k=1):
+    """
+    Extract minimal pKa (or the top_k lowest) per molecule, save the table if save and return it.
+    The pka table is read from analysis_dir unless pka_df is given.
+    """
+    if pka_df is None:
+        try:
+            pka_df = read_table(analysis_dir, f"pka_{name_file}", table_format, columns=PKA_COLUMNS)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return
+
+    if "pKa_calc" not in pka_df.columns:
+        print("Нет столбца 'pKa_calc' в файле")
+        return
 
-    df_min = df_min[[
-        "Base_Molecule", "Molecule", "Method", "Basis", "Calculation_Form",
-        "pKa (exp)", "pKa_calc"
-    ]]
-
-    out_file = output_dir / f"pka_min_{name_file}.csv"
-    df_min.to_csv(out_file, sep=";", index=False)
-
-    print(f"Сохранена таблица min-pKa в {out_file}")
\ No newline at end of file
+    df_min = min_pka_table(pka_df, top_k)
+    if save:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        out_file = write_table(df_min, output_dir, f"pka_min_{name_file}", table_format)
+        print(f"Сохранена таблица min-pKa в {out_file}")
+    return df_min
@@ -1,97 +1,119 @@
-import pandas as pd
+import re
+import csv
+import json
+import time
 import subprocess
 from pathlib import Path
 
+# Fixed squeue layout: no header, '|' never appears in the fields we need
+SQUEUE_FORMAT = "%i|%P|%j|%u|%t|%M|%D|%R"
+SQUEUE_FIELDS = ["JOBID", "PARTITION", "NAME", "USER", "ST", "TIME", "NODES", "NODELIST"]
+WATCH_MAX_FACTOR = 10  # longest poll interval with backoff, in multiples of --watch
 
-def get_squeue_output():
+
+def expand_array_tasks(job_id):
+    """Expand squeue array notation 123_[0-3,7%2] into ['123_0', ..., '123_7']"""
+    match = re.match(r'(\d+)_\[([^\]%]*)(?:%\d+)?\]$', job_id)
+    if not match:
+        return [job_id]
+    base, spec = match.groups()
+    tasks = []
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = part.split('-')[:2]
+            tasks.extend(f"{base}_{i}" for i in range(int(first), int(last) + 1))
+        elif part:
+            tasks.append(f"{base}_{part}")
+    return tasks
+
+
+def squeue_command(user):
+    return ["squeue", "-h", "-u", user, "-o", SQUEUE_FORMAT]
+
+
+def get_squeue_output(user):
+    """Query squeue only for jobs of user; None if squeue failed (not the same as no jobs)"""
     try:
-        result = subprocess.run(["squeue"], capture_output=True, text=True, check=True)
+        result = subprocess.run(squeue_command(user), capture_output=True, text=True, check=True)
         return result.stdout
     except Exception as e:
         print(f"Error when executing squeue: {e}")
-        return ""
+        return None
 
 
-def parse_squeue(output, user):
+def parse_squeue(output):
     jobs = []
     for line in output.splitlines():
-        if not line.strip() or line.startswith("JOBID"):
-            continue
-        parts = line.split()
-        if len(parts) < 7:
+        parts = line.strip().split("|")
+        if len(parts) < len(SQUEUE_FIELDS):
             continue
-        job_user = parts[3]
-        status = parts[4]
-        if job_user == user and status in ("R", "PD"):
-            job = {
-                "JOBID": parts[0],
-                "PARTITION": parts[1],
-                "NAME": parts[2],
-                "USER": job_user,
-                "ST": status,
-                "TIME": parts[5],
-                "NODES": parts[6],
-            }
-            # если Pending — причина идёт в скобках
-            if status == "PD":
-                job["NODELIST"] = " ".join(parts[7:]) if len(parts) > 7 else ""
-            else:
-                job["NODELIST"] = parts[7] if len(parts) > 7 else ""
-            jobs.append(job)
+        job = dict(zip(SQUEUE_FIELDS, parts))
+        # pending array tasks come as one line, e.g. 123_[4-9%2]
+        for job_id in expand_array_tasks(job["JOBID"]):
+            jobs.append({**job, "JOBID": job_id})
     return jobs
 
 
+def summary_files(summary_path):
+    return sorted(Path(summary_path).glob("calculations_summary_*.csv"))
+
+
 def load_all_summaries(summary_path):
-    path = Path(summary_path)
-    all_files = list(path.glob("calculations_summary_*.csv"))
+    all_files = summary_files(summary_path)
     if not all_files:
         print(f"No files found calculations_summary_*.csv в {summary_path}")
-        return pd.DataFrame()
+        return []
 
-    dfs = []
+    rows = []
     for f in all_files:
-        try:
-            df = pd.read_csv(f, sep=r"\s*[,;]\s*|\t", engine="python")
-            dfs.append(df)
-        except Exception as e:
-            print(f"Error while reading {f}: {e}")
-    if dfs:
-        return pd.concat(dfs, ignore_index=True)
-    return pd.DataFrame()
+        rows.extend(read_summary(f))
+    return rows
 
 
-def analyze_jobs(squeue_jobs, summary_df):
-    running_jobs = []
-    for job in squeue_jobs:
-        tasks = summary_df[summary_df["Job ID"].astype(str) == job["JOBID"]]
-        if not tasks.empty:
-            for _, row in tasks.iterrows():
-                running_jobs.append(
-                    {
-                        "Job ID": job["JOBID"],
-                        "Molecule": row.get("Molecule", ""),
-                        "Method": row.get("Method", ""),
-                        "Form": row.get("Form", ""),
-                        "Status": job["ST"],
-                        "Node": job["NODELIST"],
-                        "Time": job["TIME"],
-                    }
-                )
-    return running_jobs
+def read_summary(summary_file):
+    """Rows of one calculations summary file"""
+    rows = []
+    try:
+        with open(summary_file, newline="", encoding="utf-8") as fh:
+            header = fh.readline()
+            delimiter = ";" if ";" in header else ("\t" if "\t" in header else ",")
+            fh.seek(0)
+            for row in csv.DictReader(fh, delimiter=delimiter):
+                rows.append({k.strip(): (v or "").strip() for k, v in row.items() if k})
+    except Exception as e:
+        print(f"Error while reading {summary_file}: {e}")
+    return rows
 
 
-def monitor_jobs(summary_path, user):
-    """Displays a list of the user's current tasks (R и PD)."""
-    squeue_output = get_squeue_output()
-    squeue_jobs = parse_squeue(squeue_output, user)
-    summary_df = load_all_summaries(summary_path)
+def index_summaries(summary_rows):
+    """Map Job ID -> summary rows of its calculations"""
+    index = {}
+    for row in summary_rows:
+        index.setdefault(row.get("Job ID", ""), []).append(row)
+    return index
 
-    if summary_df.empty:
-        print("No task data available")
-        return
 
-    running_jobs = analyze_jobs(squeue_jobs, summary_df)
+def analyze_jobs(squeue_jobs, summary_index):
+    running_jobs = []
+    for job in squeue_jobs:
+        if job["ST"] not in ("R", "PD"):
+            continue
+        for row in summary_index.get(job["JOBID"], []):
+            running_jobs.append(
+                {
+                    "Job ID": job["JOBID"],
+                    "Molecule": row.get("Molecule", ""),
+                    "Method": row.get("Method", ""),
+                    "Form": row.get("Form", ""),
+                    "Status": job["ST"],
+                    "Node": job["NODELIST"],
+                    "Time": job["TIME"],
+                }
+            )
+    return running_jobs
 
+
+def print_jobs(running_jobs):
     if not running_jobs:
         print("There are no running or pending tasks")
         return
@@ -112,4 +134,68 @@ def monitor_jobs(summary_path, user):
     total = len(running_jobs)
     nR = sum(1 for j in running_jobs if j["Status"] == "R")
     nPD = sum(1 for j in running_jobs if j["Status"] == "PD")
-    print(f"\nSummary: {total} tasks ({nR} running, {nPD} pending)")
\ No newline at end of file
+    print(f"\nSummary: {total} tasks ({nR} running, {nPD} pending)")
+
+
+def print_jobs_json(running_jobs):
+    nR = sum(1 for j in running_jobs if j["Status"] == "R")
+    nPD = sum(1 for j in running_jobs if j["Status"] == "PD")
+    print(json.dumps({
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "total": len(running_jobs),
+        "running": nR,
+        "pending": nPD,
+        "jobs": running_jobs,
+    }), flush=True)
+
+
+def monitor_jobs(summary_path, user, watch=None, as_json=False):
+    """
+    Displays a list of the user's current tasks (R и PD).
+
+    With watch, squeue is polled every watch seconds (backing off while nothing
+    changes or squeue fails) and the list is shown again only when it changes.
+    Watching ends when squeue reports none of the tracked jobs.
+    """
+    show = print_jobs_json if as_json else print_jobs
+
+    files_state = None
+    summary_index = {}
+    previous = None
+    interval = watch
+
+    while True:
+        # re-read summaries only when they were changed, e.g. by calculate --resume
+        state = [(f, f.stat().st_mtime_ns) for f in summary_files(summary_path)]
+        if state != files_state:
+            files_state = state
+            summary_index = index_summaries(load_all_summaries(summary_path))
+            if not summary_index:
+                print("No task data available")
+                return
+
+        output = get_squeue_output(user)
+        if output is None:
+            # e.g. slurmctld briefly unreachable: keep watching instead of reporting no jobs
+            if not watch:
+                return
+            interval = min(interval * 1.5, watch * WATCH_MAX_FACTOR)
+            time.sleep(interval)
+            continue
+
+        squeue_jobs = parse_squeue(output)
+        running_jobs = analyze_jobs(squeue_jobs, summary_index)
+
+        # Time changes on every poll for running jobs, compare the rest
+        snapshot = [{k: v for k, v in job.items() if k != "Time"} for job in running_jobs]
+        if snapshot != previous:
+            show(running_jobs)
+            previous = snapshot
+            interval = watch
+        elif watch:
+            interval = min(interval * 1.5, watch * WATCH_MAX_FACTOR)
+
+        if not watch or not running_jobs:
+            return
+
+        time.sleep(interval)
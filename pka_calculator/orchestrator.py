@@ -0,0 +1,111 @@
+import asyncio
+import functools
+from .calculator import generate_calculations
+from .monitor import squeue_command, parse_squeue, read_summary
+from .processor import process_results
+from .analyzer import analyze_results
+from .min_pka import extract_min_pka
+
+
+async def get_active_job_ids(user):
+    """Job IDs of user known to squeue, or None if squeue could not be queried"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *squeue_command(user),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await proc.communicate()
+    except OSError as e:
+        print(f"Error when executing squeue: {e}")
+        return None
+
+    if proc.returncode != 0:
+        print(f"Error when executing squeue: {stderr.decode().strip()}")
+        return None
+
+    return {job["JOBID"] for job in parse_squeue(stdout.decode())}
+
+
+def submitted_job_ids(summary_file):
+    """Job IDs submitted by this campaign (summaries of earlier campaigns are ignored)"""
+    rows = read_summary(summary_file)
+    return {
+        row["Job ID"] for row in rows
+        if row.get("Status") in ("Submitted", "Running", "Pending") and row.get("Job ID")
+    }
+
+
+def refresh_tables(calc_dir, results_dir, experimental_file, name_file, workers):
+    """Parse new outputs (the parse cache skips known ones) and rebuild pKa tables"""
+    results_df = process_results(calc_dir, results_dir, name_file, workers)
+    if experimental_file:
+        _, _, pka_df = analyze_results(results_dir, experimental_file, results_dir, name_file,
+                                       results_df=results_df)
+        extract_min_pka(results_dir, results_dir, name_file, pka_df=pka_df)
+
+
+def refresh_failed(refresh):
+    """Report the error of a finished refresh; True if it failed"""
+    error = refresh.exception()
+    if error is not None:
+        print(f"Error while refreshing tables: {error!r}")
+    return error is not None
+
+
+async def run_campaign(xyz_dir, basis, methods, output_dir, results_dir, name_file, user,
+                       experimental_file=None, poll_interval=60, workers=1, **submit_options):
+    loop = asyncio.get_running_loop()
+
+    def in_thread(func, *args, **kwargs):
+        return loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    print("\n=== Submitting calculations ===")
+    summary_file = await in_thread(generate_calculations, xyz_dir, basis, methods, output_dir,
+                                   **submit_options)
+    pending = submitted_job_ids(summary_file)
+    print(f"Tracking {len(pending)} jobs")
+
+    refresh = None
+    refreshed_all = False
+    while pending:
+        await asyncio.sleep(poll_interval)
+
+        active = await get_active_job_ids(user)
+        if active is None:
+            continue
+
+        finished = {job_id for job_id in pending if job_id not in active}
+        if not finished:
+            continue
+        pending -= finished
+        print(f"\n{len(finished)} jobs finished, {len(pending)} still queued or running")
+
+        # tables are rebuilt in the background while polling goes on
+        if refresh is None or refresh.done():
+            if refresh is not None:
+                refresh_failed(refresh)
+            refresh = in_thread(refresh_tables, output_dir, results_dir, experimental_file,
+                                name_file, workers)
+            refreshed_all = not pending
+
+    if refresh is not None:
+        await asyncio.wait([refresh])
+        if refresh_failed(refresh):
+            refreshed_all = False
+
+    print("\n=== All jobs finished ===")
+    if not refreshed_all:
+        await in_thread(refresh_tables, output_dir, results_dir, experimental_file, name_file, workers)
+
+
+def orchestrate(xyz_dir, basis, methods, output_dir, results_dir, name_file, user,
+                experimental_file=None, poll_interval=60, workers=1, **submit_options):
+    """
+    Submit a campaign, poll squeue asynchronously and refresh results as jobs finish.
+
+    sbatch and squeue are looked up in PATH, so a local stand-in can replace them for testing.
+    """
+    asyncio.run(run_campaign(xyz_dir, basis, methods, output_dir, results_dir, name_file, user,
+                             experimental_file, poll_interval, workers, **submit_options))
+    print("\nCampaign completed!")
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+from pathlib import Path
+
+CACHE_FILE = ".pka_parse_cache.sqlite"
+
+
+def open_cache(calc_dir, rebuild=False):
+    """Open (or create) the parse cache in calc_dir. Returns None if it cannot be used."""
+    cache_path = Path(calc_dir) / CACHE_FILE
+    try:
+        if rebuild and cache_path.exists():
+            cache_path.unlink()
+        conn = sqlite3.connect(cache_path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                gibbs REAL,
+                run_time INTEGER,
+                terminated INTEGER NOT NULL
+            )
+        """)
+        return conn
+    except (sqlite3.Error, OSError) as e:
+        print(f"Parse cache disabled ({cache_path}): {e}")
+        return None
+
+
+def _cache_key(calc_dir, output_file):
+    # relative paths keep the cache valid when the calc tree is moved
+    return os.path.relpath(output_file, calc_dir)
+
+
+def lookup(conn, calc_dir, output_file, stat):
+    """Return cached (gibbs, run_time, terminated) if output_file is unchanged, else None"""
+    row = conn.execute(
+        "SELECT size, mtime_ns, gibbs, run_time, terminated FROM outputs WHERE path = ?",
+        (_cache_key(calc_dir, output_file),)
+    ).fetchone()
+    if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+        return None
+    return row[2], row[3], bool(row[4])
+
+
+def store(conn, calc_dir, entries):
+    """Save [(output_file, stat, (gibbs, run_time, terminated)), ...] to the cache"""
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (_cache_key(calc_dir, output_file), stat.st_size, stat.st_mtime_ns,
+                     gibbs, run_time, int(terminated))
+                    for output_file, stat, (gibbs, run_time, terminated) in entries
+                ]
+            )
+    except sqlite3.Error as e:
+        print(f"Could not update parse cache: {e}")
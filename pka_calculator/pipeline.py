@@ -0,0 +1,48 @@
+from .processor import process_results, write_results_table
+from .analyzer import analyze_results, save_pka_tables
+from .min_pka import extract_min_pka
+from .storage import write_table
+from .visualizer import visualize_results
+from .interactive import make_interactive_html
+
+
+def run_pipeline(calc_dir, experimental_file, output_dir, name_file, workers=1, pool='process',
+                 use_cache=True, rebuild_cache=False, table_format='csv', save_tables=True,
+                 top_k=1, plotlyjs='cdn', rescan=False):
+    """
+    Process, analyze, extract minimal pKa and plot, passing the tables between stages in memory.
+    The tables are written to output_dir at the end if save_tables.
+    """
+    print("\n=== Processing calculation results ===")
+    results_df = process_results(calc_dir, output_dir, name_file, workers, pool,
+                                 use_cache, rebuild_cache, save=False, rescan=rescan)
+
+    print("\n=== Analyzing results ===")
+    gh_df, gh_stats, pka_df = analyze_results(output_dir, experimental_file, output_dir, name_file,
+                                              results_df=results_df, save=False)
+
+    print("\n=== Extracting minimal pKa values ===")
+    pka_min_df = extract_min_pka(output_dir, output_dir, name_file, pka_df=pka_df, save=False,
+                                 top_k=top_k)
+
+    print("\n=== Generating visualization for minimal pKa ===")
+    visualize_results(output_dir, output_dir, name_file, pka_min_df=pka_min_df, workers=workers)
+
+    print("\n=== Building interactive HTML visualization ===")
+    make_interactive_html(
+        name_file=name_file,
+        analysis_dir=output_dir,
+        output_dir=output_dir,
+        manual_coeffs=None,
+        html_name=f"pka_{name_file}_interactive.html",
+        pka_df=pka_df,
+        plotlyjs=plotlyjs
+    )
+
+    if save_tables:
+        print("\n=== Saving tables ===")
+        write_results_table(results_df, output_dir, name_file, table_format)
+        save_pka_tables(gh_df, gh_stats, pka_df, output_dir, name_file, table_format)
+        write_table(pka_min_df, output_dir, f"pka_min_{name_file}", table_format)
+
+    print("\nPipeline completed successfully!")
@@ -1,54 +1,182 @@
 import os
 import re
-import csv
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from . import parse_cache
+from . import manifest
+from .geometry import load_aliases
 import pprint
 import json
 
-def parse_output_file(output_file):
+GIBBS_PATTERN = re.compile(rb'Final Gibbs free energy\s+\.\.\.\s+([-\d\.]+)\s+Eh')
+RUN_TIME_PATTERN = re.compile(rb'TOTAL RUN TIME:\s+(\d+)\s+days\s+(\d+)\s+hours\s+(\d+)\s+minutes')
+TERMINATION_MARKER = b'ORCA TERMINATED NORMALLY'
+
+TAIL_BLOCK_SIZE = 64 * 1024      # bytes read per step when scanning back from EOF
+TAIL_BLOCK_OVERLAP = 512         # longer than any marker line, so matches across block borders are kept
+TAIL_MAX_BYTES = 8 * 1024 * 1024 # give up on the tail scan and search forward after this
+
+ENERGY_COLUMNS = ["G_N", "G_D", "G_P"]
+TIME_COLUMNS = ["t_N", "t_D", "t_P"]
+
+
+def _scan_tail(mm, patterns):
+    """Search blocks from the end of the mapped file until every pattern has matched"""
+    found = [None] * len(patterns)
+    end = len(mm)
+    limit = max(0, end - TAIL_MAX_BYTES)
+
+    while end > limit and any(m is None for m in found):
+        start = max(limit, end - TAIL_BLOCK_SIZE)
+        block = mm[start:min(len(mm), end + TAIL_BLOCK_OVERLAP)]
+        for i, pattern in enumerate(patterns):
+            if found[i] is not None:
+                continue
+            matches = list(pattern.finditer(block))
+            if matches:
+                found[i] = matches[-1]
+        end = start
+
+    return found
+
+
+def _scan_forward(mm, patterns, found):
+    """Fill in markers missing from the tail by searching the whole mapped file"""
+    return [m if m is not None else pattern.search(mm) for pattern, m in zip(patterns, found)]
+
+
+def parse_output(output_file, tail_scan=True):
+    """
+    Parse final Gibbs free energy (Eh), total run time (min) and normal termination from ORCA output.
+
+    The file is memory-mapped; with tail_scan the markers are looked up from EOF
+    backwards block by block, and a forward scan is done only for markers not found there.
+    """
     gibbs_energy = None
     run_time_min = None
-    
-    with open(output_file, 'r') as f:
-        content = f.read()
-        
-        gibbs_match = re.search(r'Final Gibbs free energy\s+\.\.\.\s+([-\d\.]+)\s+Eh', content)
-        if gibbs_match:
-            gibbs_energy = float(gibbs_match.group(1))
-        
-        time_match = re.search(r'TOTAL RUN TIME:\s+(\d+)\s+days\s+(\d+)\s+hours\s+(\d+)\s+minutes', content)
-        if time_match:
-            days = int(time_match.group(1))
-            hours = int(time_match.group(2))
-            minutes = int(time_match.group(3))
-            run_time_min = days*24*60 + hours*60 + minutes
-    
+    terminated = False
+    patterns = (GIBBS_PATTERN, RUN_TIME_PATTERN)
+
+    with open(output_file, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file, nothing to map
+            return gibbs_energy, run_time_min, terminated
+
+        with mm:
+            # ORCA prints the termination banner as the last lines of the output
+            terminated = mm.rfind(TERMINATION_MARKER, max(0, len(mm) - TAIL_BLOCK_SIZE)) != -1
+
+            found = _scan_tail(mm, patterns) if tail_scan else [None] * len(patterns)
+            if any(m is None for m in found):
+                found = _scan_forward(mm, patterns, found)
+            gibbs_match, time_match = found
+
+            if gibbs_match:
+                gibbs_energy = float(gibbs_match.group(1))
+
+            if time_match:
+                days = int(time_match.group(1))
+                hours = int(time_match.group(2))
+                minutes = int(time_match.group(3))
+                run_time_min = days*24*60 + hours*60 + minutes
+
+    return gibbs_energy, run_time_min, terminated
+
+def parse_output_file(output_file, tail_scan=True):
+    """Parse final Gibbs free energy (Eh) and total run time (min) from ORCA output"""
+    gibbs_energy, run_time_min, _ = parse_output(output_file, tail_scan)
     return gibbs_energy, run_time_min
 
-def collect_results(calc_dir):
-    results = {}
-    
-    for root, dirs, files in os.walk(calc_dir):
-        if "output.out" in files:
-            output_file = os.path.join(root, "output.out")
-            path_parts = Path(root).parts
-            
-            # calc_dir/basis/molecule/form/method
-            if len(path_parts) >= 5:
-                basis = path_parts[-4]
-                molecule = path_parts[-3]
-                form = path_parts[-2]
-                method = path_parts[-1]
-                
-                gibbs, time = parse_output_file(output_file)
-                results[(basis, molecule, method, form)] = (gibbs, time)
-    
+def find_output_files(calc_dir, rescan=False):
+    """
+    Return sorted [((basis, molecule, method, form), output_file), ...] under calc_dir.
+    Calculations are taken from the manifest; rescan rebuilds it from the tree.
+    """
+    found = []
+
+    # calc_dir/basis/molecule/form/method
+    for (basis, molecule, form, method) in manifest.load_manifest(calc_dir, rescan):
+        output_file = os.path.join(calc_dir, basis, molecule, form, method, "output.out")
+        if os.path.exists(output_file):
+            found.append(((basis, molecule, method, form), output_file))
+
+    found.sort()
+    return found
+
+def _parse_files(files, workers=1, pool='process'):
+    """Run parse_output over files, serially or in a worker pool, keeping input order"""
+    if workers is None or workers <= 1 or len(files) < 2:
+        return [parse_output(output_file) for output_file in files]
+
+    executor_cls = ThreadPoolExecutor if pool == 'thread' else ProcessPoolExecutor
+    chunksize = max(1, len(files) // (workers * 4))
+    with executor_cls(max_workers=workers) as executor:
+        return list(executor.map(parse_output, files, chunksize=chunksize))
+
+def collect_results(calc_dir, workers=1, pool='process', use_cache=True, rebuild_cache=False,
+                    rescan=False):
+    """
+    Parse every output.out under calc_dir.
+
+    With workers > 1 files are parsed in a process (or thread) pool; results are
+    merged in discovery order, so the dict is the same as for the serial run.
+    With use_cache only files that are new or changed since the last run are parsed.
+    The manifest of calc_dir is updated with the termination status of each output.
+    """
+    outputs = find_output_files(calc_dir, rescan)
+
+    conn = parse_cache.open_cache(calc_dir, rebuild_cache) if use_cache else None
+
+    parsed = {}
+    missing = []
+    for key, output_file in outputs:
+        stat = os.stat(output_file)
+        entry = None
+        if conn is not None:
+            entry = parse_cache.lookup(conn, calc_dir, output_file, stat)
+        if entry is None:
+            missing.append((key, output_file, stat))
+        else:
+            parsed[key] = entry
+
+    fresh = _parse_files([output_file for _, output_file, _ in missing], workers, pool)
+    for (key, output_file, stat), entry in zip(missing, fresh):
+        parsed[key] = entry
+
+    if conn is not None:
+        parse_cache.store(conn, calc_dir, [
+            (output_file, stat, entry) for (_, output_file, stat), entry in zip(missing, fresh)
+        ])
+        conn.close()
+        print(f"Parse cache: {len(outputs) - len(missing)} hits, {len(missing)} misses")
+
+    statuses = {}
+    for (basis, molecule, method, form), entry in parsed.items():
+        statuses[(basis, molecule, form, method)] = manifest.FINISHED if entry[2] else manifest.INCOMPLETE
+    if statuses:
+        manifest.update_manifest(calc_dir, statuses)
+
+    results = {key: parsed[key][:2] for key, _ in outputs}
+    return apply_aliases(results, load_aliases(calc_dir))
+
+def apply_aliases(results, aliases):
+    """Copy energies of calculated structures to their duplicates {(basis, molecule, form): (molecule, form)}"""
+    duplicates = {}
+    for (basis, molecule, form), (target_molecule, target_form) in aliases.items():
+        duplicates.setdefault((basis, target_molecule, target_form), []).append((molecule, form))
+
+    for (basis, molecule, method, form), value in list(results.items()):
+        for alias_molecule, alias_form in duplicates.get((basis, molecule, form), []):
+            results.setdefault((basis, alias_molecule, method, alias_form), value)
     return results
 
-def generate_results_table(results, output_dir, name_file):
-    output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True)
-    
+def results_dataframe(results):
+    """Results table (one row per molecule form, method and basis) from collected results"""
+    import pandas as pd  # not at module level: calculate only needs parse_output
+
     molecules = sorted({key[1] for key in results.keys()})
     methods = sorted({key[2] for key in results.keys()})
     basis_sets = sorted({key[0] for key in results.keys()})
@@ -105,12 +233,12 @@ def generate_results_table(results, output_dir, name_file):
                         method,     # Method
                         basis,      # Basis
                         "neutral",  # Calculation_Form
-                        f"{gibbs_n:.6f}" if gibbs_n is not None else '',  # G_N
-                        '',  # G_D
-                        '',  # G_P
-                        str(time_n) if time_n is not None else '',  # t_N
-                        '',  # t_D
-                        ''   # t_P
+                        gibbs_n,    # G_N
+                        None,       # G_D
+                        None,       # G_P
+                        time_n,     # t_N
+                        None,       # t_D
+                        None        # t_P
                     ]
                     rows.append(row)
                 
@@ -138,28 +266,52 @@ def generate_results_table(results, output_dir, name_file):
                         method,              # Method
                         basis,               # Basis
                         calculation_form,    # Calculation_Form
-                        f"{gibbs_n:.6f}" if gibbs_n is not None else '',  # G_N
-                        f"{gibbs_d:.6f}" if gibbs_d is not None else '',  # G_D
-                        f"{gibbs_p:.6f}" if gibbs_p is not None else '',  # G_P
-                        str(time_n) if time_n is not None else '',  # t_N
-                        str(time_d) if time_d is not None else '',  # t_D
-                        str(time_p) if time_p is not None else ''   # t_P
+                        gibbs_n,             # G_N
+                        gibbs_d,             # G_D
+                        gibbs_p,             # G_P
+                        time_n,              # t_N
+                        time_d,              # t_D
+                        time_p               # t_P
                     ]
                     rows.append(row)
     
+    df = pd.DataFrame(rows, columns=headers)
+    df[ENERGY_COLUMNS] = df[ENERGY_COLUMNS].astype('float64')
+    df[TIME_COLUMNS] = df[TIME_COLUMNS].astype('Int64')  # whole minutes
+    return df
+
+def write_results_table(df, output_dir, name_file, table_format='csv'):
+    import pandas as pd
+    from .storage import write_table
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
+
+    if table_format != 'csv':
+        # binary tables keep the full float64 energies
+        return write_table(df, output_dir, f"results_{name_file}", table_format)
+
     csv_file = output_dir / f"results_{name_file}.csv"
-    with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f, delimiter=';')
-        writer.writerow(headers)
-        writer.writerows(rows)
-    
+    df = df.copy()
+    for column in ENERGY_COLUMNS:
+        df[column] = [f"{g:.6f}" if pd.notna(g) else '' for g in df[column]]
+    df.to_csv(csv_file, sep=';', index=False, lineterminator='\r\n')
     return csv_file
 
-def process_results(calc_dir, output_dir, name_file):
-    """Process calculation results and generate output files"""
+def generate_results_table(results, output_dir, name_file, table_format='csv'):
+    return write_results_table(results_dataframe(results), output_dir, name_file, table_format)
+
+def process_results(calc_dir, output_dir, name_file, workers=1, pool='process',
+                    use_cache=True, rebuild_cache=False, table_format='csv', save=True,
+                    rescan=False):
+    """Process calculation results, save the results table if save and return it"""
     print(f"Processing results from {calc_dir}")
+    if workers and workers > 1:
+        print(f"Parsing outputs with {workers} {pool} workers")
     
-    results = collect_results(calc_dir)
-    csv_file = generate_results_table(results, output_dir, name_file)
-    
-    print(f"Results processed successfully! Output saved to {csv_file}")
\ No newline at end of file
+    results = collect_results(calc_dir, workers, pool, use_cache, rebuild_cache, rescan)
+    results_df = results_dataframe(results)
+    if save:
+        table_file = write_results_table(results_df, output_dir, name_file, table_format)
+        print(f"Results processed successfully! Output saved to {table_file}")
+    return results_df
@@ -0,0 +1,91 @@
+from pathlib import Path
+import pandas as pd
+
+# Formats of the results -> gh_values -> pka -> pka_min tables.
+# parquet and feather need the optional pyarrow package.
+TABLE_FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+CATEGORY_COLUMNS = ['Method', 'Basis', 'Calculation_Form']
+
+
+def require_pyarrow(table_format):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            f"The {table_format} table format needs pyarrow: pip install pyarrow"
+        ) from None
+
+
+def table_path(directory, stem, table_format='csv'):
+    return Path(directory) / f"{stem}{TABLE_FORMATS[table_format]}"
+
+
+def find_table(directory, stem, table_format='csv'):
+    """Path of the stem table, preferring table_format but accepting any stored format"""
+    formats = [table_format] + [f for f in TABLE_FORMATS if f != table_format]
+    for fmt in formats:
+        path = table_path(directory, stem, fmt)
+        if path.exists():
+            return path, fmt
+    return table_path(directory, stem, table_format), table_format
+
+
+def write_table(df, directory, stem, table_format='csv'):
+    """Write df as directory/stem.<ext>; binary formats keep float64 and store labels as categories"""
+    path = table_path(directory, stem, table_format)
+    if table_format == 'csv':
+        df.to_csv(path, sep=';', index=False)
+        return path
+
+    require_pyarrow(table_format)
+    df = df.reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    if table_format == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+    return path
+
+
+def table_columns(path, table_format):
+    if table_format == 'csv':
+        return pd.read_csv(path, sep=';', nrows=0).columns.tolist()
+    require_pyarrow(table_format)
+    if table_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    import pyarrow.ipc
+    with pyarrow.ipc.open_file(path) as reader:
+        return reader.schema.names
+
+
+def read_table(directory, stem, table_format='csv', columns=None):
+    """
+    Read directory/stem in table_format (falling back to another stored format).
+
+    Only the columns present in the file are read when columns is given.
+    Categorical columns come back as plain strings, like from CSV.
+    Raises FileNotFoundError if the table is missing.
+    """
+    path, table_format = find_table(directory, stem, table_format)
+    if not path.exists():
+        raise FileNotFoundError(f"File {path} not found")
+
+    if columns is not None:
+        available = set(table_columns(path, table_format))
+        columns = [c for c in columns if c in available]
+
+    if table_format == 'csv':
+        return pd.read_csv(path, sep=';', usecols=columns)
+
+    require_pyarrow(table_format)
+    if table_format == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_feather(path, columns=columns)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(df[column].cat.categories.dtype)
+    return df
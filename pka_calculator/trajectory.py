@@ -0,0 +1,58 @@
+import os
+
+TRJ_BLOCK_SIZE = 8192
+
+
+def _find_last_frame(lines):
+    """
+    Return ((num_atoms, comment, atoms), largest atom count seen) for the last complete
+    frame in lines, or (None, largest atom count seen) if there is none.
+    """
+    end = len(lines)
+    while end > 0 and not lines[end - 1].strip():
+        end -= 1
+
+    # header is the line with the atom count followed by a comment and exactly that many atoms
+    largest = 0
+    for i in range(end - 1, -1, -1):
+        header = lines[i].strip()
+        if not header.isdigit():
+            continue
+        num_atoms = int(header)
+        largest = max(largest, num_atoms)
+        if end - i - 2 == num_atoms:
+            comment = lines[i + 1]
+            atoms = [line.strip().split() for line in lines[i + 2:end]]
+            return (num_atoms, comment, atoms), largest
+        if end - i - 2 < num_atoms:
+            # frame cut off (optimization still running): try the one before it
+            end = i
+    return None, largest
+
+
+def get_last_frame_from_trj(trj_file_path):
+    """
+    Extract the last complete frame from input_trj.xyz, reading it backwards from the end.
+    A truncated last frame is skipped; reading stops after about two frames without a match.
+    """
+    with open(trj_file_path, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        buffer = b''
+        block = TRJ_BLOCK_SIZE
+
+        while pos > 0:
+            size = min(block, pos)
+            pos -= size
+            f.seek(pos)
+            buffer = f.read(size) + buffer
+
+            lines = buffer.decode(errors='replace').splitlines()
+            # the first line may be cut in the middle unless the start of file is reached
+            frame, largest = _find_last_frame(lines if pos == 0 else lines[1:])
+            if frame is not None:
+                return frame
+            if largest and len(lines) > 2 * (largest + 2) + 1:
+                break
+            block *= 2
+
+    raise ValueError("No frames found in input_trj.xyz")
@@ -1,148 +1,226 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+# figures are only saved to files: draw on Agg canvases without pyplot,
+# so importing this module does not change the backend of the caller
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
-from scipy.stats import linregress
 from pathlib import Path
-import math
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from .storage import read_table
+from .calibration import fit_calibrations, replace_lines
 
-def visualize_results(analysis_dir, output_dir, name_file, calibration_file=None):
-    """
-    Visualization of calculated pKa versus experimental values ​​from pka_min_*.csv
-    """
-    print(f"Visualizing results from {analysis_dir}")
+PLOT_DPI = 300
+PLOT_HASHES_FILE = ".plot_hashes.json"
+COLORS = {"Calculated": "blue", "Calibrated": "green"}
+MARKERS = {"Calculated": "s", "Calibrated": "^"}
 
-    analysis_dir = Path(analysis_dir)
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    pka_file = analysis_dir / f"pka_min_{name_file}.csv"
-    try:
-        df = pd.read_csv(pka_file, sep=";")
-    except FileNotFoundError:
-        print(f"Error: File {pka_file} not found")
-        return
+def plot_file_name(method, basis, form):
+    return re.sub(r'[^\w.+-]', '_', f"{method}_{basis}_{form}") + ".png"
 
-    required_cols = {"pKa (exp)", "pKa_calc", "Method", "Basis", "Calculation_Form"}
-    if not required_cols.issubset(df.columns):
-        print(f"The file does not contain the required columns: {required_cols}")
-        return
 
-    calibration_params = {}
-    if calibration_file is not None:
-        calib_path = Path(calibration_file)
-        if calib_path.exists():
-            calib_df = pd.read_csv(calib_path, sep=";")
-            for _, row in calib_df.iterrows():
-                key = (row["Method"], row["Basis"], row["Calculation_Form"])
-                calibration_params[key] = (row["Slope"], row["Intercept"])
-            print(f"Loaded calibration parameters from {calibration_file}")
+def content_hash(*data):
+    """Hash of the plotted data and PLOT_DPI, to skip re-rendering unchanged figures"""
+    digest = hashlib.sha256(repr(PLOT_DPI).encode())
+    for item in data:
+        if isinstance(item, np.ndarray):
+            digest.update(np.ascontiguousarray(item, dtype=float).tobytes())
         else:
-            print(f"Calibration file {calibration_file} not found. Will calculate new parameters.")
+            digest.update(repr(item).encode())
+    return digest.hexdigest()
+
 
-    combinations = df[["Method", "Basis", "Calculation_Form"]].drop_duplicates()
-    colors = {"Calculated": "blue", "Calibrated": "green"}
-    markers = {"Calculated": "s", "Calibrated": "^"}
+def load_plot_hashes(plots_dir):
+    try:
+        with open(plots_dir / PLOT_HASHES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    n_cols = 3
-    n_rows = math.ceil(len(combinations) / n_cols)
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(6*n_cols, 5*n_rows))
-    axes = axes.flatten()
-    fig.suptitle("Comparison of Experimental and Calculated pKa Values", fontsize=16)
 
-    for i, row in combinations.iterrows():
-        method, basis, form = row["Method"], row["Basis"], row["Calculation_Form"]
-        label_comb = f"{method} | {basis} | {form}"
-        ax = axes[i]
+def save_plot_hashes(plots_dir, hashes):
+    with open(plots_dir / PLOT_HASHES_FILE, 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
 
-        subset = df[(df["Method"] == method) & (df["Basis"] == basis) & (df["Calculation_Form"] == form)]
-        subset = subset.dropna(subset=["pKa (exp)", "pKa_calc"])
 
-        x = subset["pKa (exp)"].values
-        y = subset["pKa_calc"].values
+def new_figure(figsize):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
 
-        ax.scatter(x, y, c=colors["Calculated"], marker=markers["Calculated"],
-                   label="Calculated", alpha=0.7, s=80)
 
-        if len(x) > 1:
-            if (method, basis, form) not in calibration_params:
-                slope, intercept, _, _, _ = linregress(x, y)
-                calibration_params[(method, basis, form)] = (slope, intercept)
-            else:
-                slope, intercept = calibration_params[(method, basis, form)]
+def render_combination(plot_path, label, x, y, calibration):
+    fig, ax = new_figure((6, 5))
 
-            r_squared = np.corrcoef(x, y)[0, 1] ** 2
-            calibrated_y = (y - intercept) / slope
+    ax.scatter(x, y, c=COLORS["Calculated"], marker=MARKERS["Calculated"],
+               label="Calculated", alpha=0.7, s=80)
 
-            ax.scatter(x, calibrated_y, c=colors["Calibrated"], marker=markers["Calibrated"],
-                       label=f"Calibrated (R²={r_squared:.2f})", alpha=0.7, s=80)
+    if calibration is not None:
+        slope, intercept, r_squared = calibration
+        calibrated_y = (y - intercept) / slope
+        ax.scatter(x, calibrated_y, c=COLORS["Calibrated"], marker=MARKERS["Calibrated"],
+                   label=f"Calibrated (R²={r_squared:.2f})", alpha=0.7, s=80)
 
+    if len(x) > 0:
         min_val = min(x.min(), y.min()) - 1
         max_val = max(x.max(), y.max()) + 1
         ax.plot([min_val, max_val], [min_val, max_val], "k--", alpha=0.5)
-
-        ax.set_xlabel("Experimental pKa", fontsize=12)
-        ax.set_ylabel("Calculated pKa", fontsize=12)
-        ax.set_title(label_comb, fontsize=10)
         ax.set_xlim([min_val, max_val])
         ax.set_ylim([min_val, max_val])
-        ax.legend(fontsize=8)
-        ax.grid(True, alpha=0.3)
 
-    for j in range(len(combinations), len(axes)):
-        axes[j].axis('off')
+    ax.set_xlabel("Experimental pKa", fontsize=12)
+    ax.set_ylabel("Calculated pKa", fontsize=12)
+    ax.set_title(label, fontsize=10)
+    ax.legend(fontsize=8)
+    ax.grid(True, alpha=0.3)
 
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plot_path = output_dir / f"pka_min_{name_file}.png"
-    plt.savefig(plot_path, dpi=300, bbox_inches="tight")
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(plot_path, dpi=PLOT_DPI, bbox_inches="tight")
 
-    # --- Bar plot MAE ---
-    mae_results = []
-    for (method, basis, form), (slope, intercept) in calibration_params.items():
-        subset = df[(df["Method"] == method) & (df["Basis"] == basis) & (df["Calculation_Form"] == form)]
-        subset = subset.dropna(subset=["pKa (exp)", "pKa_calc"])
-
-        x = subset["pKa (exp)"].values
-        y = subset["pKa_calc"].values
 
-        mae_calc = np.mean(np.abs(y - x))
-        mae_results.append({"Combination": f"{method}|{basis}|{form}", "Source": "Calculated", "MAE": mae_calc})
-
-        calibrated = (y - intercept) / slope
-        mae_calib = np.mean(np.abs(calibrated - x))
-        mae_results.append({"Combination": f"{method}|{basis}|{form}", "Source": "Calibrated", "MAE": mae_calib})
-
-    mae_df = pd.DataFrame(mae_results)
-    fig, ax = plt.subplots(figsize=(14, 6))
+def render_mae(plot_path, mae_df):
+    combinations = mae_df["Combination"].unique()
+    fig, ax = new_figure((max(14, 0.4 * len(combinations)), 6))
     width = 0.35
-    x_pos = np.arange(len(mae_df["Combination"].unique()))
+    x_pos = np.arange(len(combinations))
 
     for i, source in enumerate(["Calculated", "Calibrated"]):
         values = mae_df[mae_df["Source"] == source]["MAE"]
-        ax.bar(x_pos + i * width, values, width, label=source, color=colors[source])
+        ax.bar(x_pos + i * width, values, width, label=source, color=COLORS[source])
 
     ax.set_xlabel("Combination (Method|Basis|Form)", fontsize=12)
     ax.set_ylabel("Mean Absolute Error (MAE)", fontsize=12)
     ax.set_title("Method/Basis/Form Accuracy Comparison", fontsize=14)
     ax.set_xticks(x_pos + width / 2)
-    ax.set_xticklabels(mae_df["Combination"].unique(), rotation=45, ha="right", fontsize=9)
+    ax.set_xticklabels(combinations, rotation=45, ha="right", fontsize=9)
     ax.legend()
     ax.grid(True, linestyle="--", alpha=0.6)
 
-    plt.tight_layout()
-    plt.savefig(output_dir / f"pka_min_mae_{name_file}.png", dpi=300, bbox_inches="tight")
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(plot_path, dpi=PLOT_DPI, bbox_inches="tight")
+
+
+def render_plot(job):
+    """Render one figure; job is (path, mae_df) or (path, label, x, y, calibration)"""
+    if len(job) == 2:
+        render_mae(*job)
+    else:
+        render_combination(*job)
+
+
+def visualize_results(analysis_dir, output_dir, name_file, calibration_file=None,
+                      table_format='csv', pka_min_df=None, workers=1):
+    """
+    Visualization of calculated pKa versus experimental values ​​from pka_min_*.csv
+    (or from pka_min_df when given).
+
+    Every Method/Basis/Form combination gets its own figure in pka_min_<name_file>/,
+    rendered by workers processes. Figures whose data did not change since the
+    last run are kept.
+    """
+    print(f"Visualizing results from {analysis_dir if pka_min_df is None else 'memory'}")
+
+    analysis_dir = Path(analysis_dir)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    required_cols = {"pKa (exp)", "pKa_calc", "Method", "Basis", "Calculation_Form"}
+    if pka_min_df is not None:
+        df = pka_min_df
+    else:
+        try:
+            df = read_table(analysis_dir, f"pka_min_{name_file}", table_format,
+                            columns=sorted(required_cols) + ["Rank"])
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return
+
+    # tables from minpka --top-k: plot the lowest form only
+    if "Rank" in df.columns:
+        df = df[df["Rank"] == 1]
+
+    if not required_cols.issubset(df.columns):
+        print(f"The file does not contain the required columns: {required_cols}")
+        return
+
+    group_columns = ["Method", "Basis", "Calculation_Form"]
+    # all combinations in one batched fit, with bootstrap CIs and leave-one-out MAE
+    fits = fit_calibrations(df, group_columns)
+    if calibration_file is not None:
+        calib_path = Path(calibration_file)
+        if calib_path.exists():
+            calib_df = pd.read_csv(calib_path, sep=";")
+            fits = replace_lines(df, fits, calib_df.dropna(subset=["Slope", "Intercept"]), group_columns)
+            print(f"Loaded calibration parameters from {calibration_file}")
+        else:
+            print(f"Calibration file {calibration_file} not found. Will calculate new parameters.")
+    fits = fits[fits["N"] >= 2].reset_index(drop=True)
+    fit_by_key = {key: row for key, row in zip(fits[group_columns].itertuples(index=False, name=None),
+                                               fits.itertuples(index=False))}
+
+    # one pass over the table instead of boolean masks per combination
+    subsets = {
+        key: group.dropna(subset=["pKa (exp)", "pKa_calc"])
+        for key, group in df.groupby(group_columns, sort=False)
+    }
+
+    plots_dir = output_dir / f"pka_min_{name_file}"
+    plots_dir.mkdir(exist_ok=True)
+    previous = load_plot_hashes(plots_dir)
+    hashes = {}
+
+    jobs = []
+    mae_results = []
+    for (method, basis, form), subset in subsets.items():
+        x = subset["pKa (exp)"].values
+        y = subset["pKa_calc"].values
+
+        calibration = None
+        fit = fit_by_key.get((method, basis, form))
+        if fit is not None:
+            calibration = (fit.Slope, fit.Intercept, fit.R2)
+            combination = f"{method}|{basis}|{form}"
+            mae_results.append({"Combination": combination, "Source": "Calculated",
+                                "MAE": fit.MAE_calc})
+            mae_results.append({"Combination": combination, "Source": "Calibrated",
+                                "MAE": fit.MAE_calibrated})
+
+        plot_name = plot_file_name(method, basis, form)
+        args = (f"{method} | {basis} | {form}", x, y, calibration)
+        digest = content_hash(*args)
+        if previous.get(plot_name) != digest or not (plots_dir / plot_name).exists():
+            jobs.append((plots_dir / plot_name, *args))
+        hashes[plot_name] = digest
+
+    mae_df = pd.DataFrame(mae_results, columns=["Combination", "Source", "MAE"])
+    mae_name = f"pka_min_mae_{name_file}.png"
+    mae_args = (mae_df["Combination"].tolist(), mae_df["Source"].tolist(), mae_df["MAE"].tolist())
+    digest = content_hash(*mae_args)
+    if previous.get(mae_name) != digest or not (output_dir / mae_name).exists():
+        jobs.append((output_dir / mae_name, mae_df))
+    hashes[mae_name] = digest
+
+    print(f"Rendering {len(jobs)} plots ({len(subsets) + 1 - len(jobs)} unchanged)")
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(render_plot, jobs))
+    else:
+        for job in jobs:
+            render_plot(job)
+    save_plot_hashes(plots_dir, hashes)
 
     calib_save_path = output_dir / f"calibration_params_{name_file}.csv"
-    calib_save_df = pd.DataFrame([
-        {"Method": m, "Basis": b, "Calculation_Form": f, "Slope": s, "Intercept": i}
-        for (m, b, f), (s, i) in calibration_params.items()
-    ])
-    calib_save_df.to_csv(calib_save_path, sep=";", index=False)
+    fits.to_csv(calib_save_path, sep=";", index=False)
     print(f"Calibration parameters saved to {calib_save_path}")
 
-    print("\nCalibration parameters (y = a*pKa + b):")
-    for combo, (slope, intercept) in calibration_params.items():
-        print(f"{combo}: a = {slope:.4f}, b = {intercept:.4f}")
+    print("\nCalibration parameters (y = a*pKa + b, 95% bootstrap CI):")
+    for fit in fits.itertuples(index=False):
+        print(f"{(fit.Method, fit.Basis, fit.Calculation_Form)}: "
+              f"a = {fit.Slope:.4f} [{fit.Slope_CI_low:.4f}, {fit.Slope_CI_high:.4f}], "
+              f"b = {fit.Intercept:.4f} [{fit.Intercept_CI_low:.4f}, {fit.Intercept_CI_high:.4f}], "
+              f"MAE LOO = {fit.MAE_LOO:.3f}")
 
-    print(f"Visualization complete! Plots saved to {plot_path}")
+    print(f"Visualization complete! Plots saved to {plots_dir}")